@@ -2,16 +2,121 @@
 test your agent's strength against a set of known agents using tournament.py
 and include the results in your report.
 """
+import collections
+import json
 import math
+import mmap
+import multiprocessing
+import random
+import struct
+import time
 
 
 class SearchTimeout(Exception):
     """Subclass base exception for code clarity. """
     pass
 
-# a global variable used by custom_score_3
-# stores a previously computed maximum distance between players
-max_distance_between_players = None
+class Evaluator:
+    """Evaluation layer of one player: heuristic state that depends on the
+    position the player is searching from rather than on the position being
+    evaluated, and a cache of scores.
+
+    The player calls `set_root` once per move, before searching, and the
+    state is read-only during the search. Score functions reading it are
+    therefore pure functions of the position for the whole search, so their
+    values can be cached and computed in any order or in another process.
+
+    Parameters
+    ----------
+    cache_size : int (optional)
+        Number of scores kept by `evaluate`; 0 or None disables the cache.
+
+    Attributes
+    ----------
+    root_distance : int or None
+        Manhattan distance between the players at the root, used by
+        `custom_score_3`; None while a player is not placed yet.
+    """
+    def __init__(self, cache_size=1 << 16):
+        self.root_distance = None
+        self.cache = EvaluationCache(cache_size) if cache_size else None
+
+    def evaluate(self, score, game, player):
+        """Return `score(game, player)`, memoized by the position hash when
+        `game` is a `BitBoard`.
+        """
+        if self.cache is None or not isinstance(game, BitBoard):
+            return score(game, player)
+        key = game.hash_for(player)
+        value = self.cache.get(key)
+        if value is None:
+            value = score(game, player)
+            self.cache.put(key, value)
+        return value
+
+    def set_root(self, game, player):
+        """Record the root position of a search by `player`.
+
+        Returns
+        -------
+        bool
+            True if the recorded state changed.
+        """
+        root_distance = player_distance(game, player)
+        changed = root_distance != self.root_distance
+        self.root_distance = root_distance
+        return changed
+
+
+class EvaluationCache:
+    """Bounded least recently used map of position hash -> score.
+
+    Parameters
+    ----------
+    maxsize : int
+        Number of scores kept.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.scores = collections.OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        value = self.scores.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.scores.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.scores[key] = value
+        if len(self.scores) > self.maxsize:
+            self.scores.popitem(last=False)
+
+    def clear(self):
+        self.scores.clear()
+
+
+def mobility(game, player):
+    """Number of legal moves of `player`, counted on the bitmasks of a
+    `BitBoard` without building the list of moves."""
+    count_moves = getattr(game, 'count_moves', None)
+    if count_moves is not None:
+        return count_moves(player)
+    return len(game.get_legal_moves(player))
+
+
+def player_distance(game, player):
+    """Manhattan distance between `player` and its opponent, None if either
+    of them has not moved yet."""
+    own = game.get_player_location(player)
+    opp = game.get_player_location(game.get_opponent(player))
+    if own is None or opp is None:
+        return None
+    return abs(own[0] - opp[0]) + abs(own[1] - opp[1])
+
 
 def custom_score_3(game, player):
     """Calculate the heuristic value of a game state from the point of view
@@ -23,6 +128,10 @@ def custom_score_3(game, player):
     Strategy
     ---------
    heuristic with Manhattan dist: This heuristic takes the distance between the two players and minimizes it. Manhattan distance method is used to calculate the distance between the two squares (as they can move in L-shaped fashion, and this way of measuring is close to approximating that). The idea behind this heuristic is, typically the distance between the players gets smaller towards the end of the game. An adversarial agent would try to block the moves of the opponent, and will be actively trying to get closer to them as the result.
+
+    The distance is compared with the distance at the root of the search,
+    recorded in the player's `Evaluator` (`player.evaluator`) when it starts
+    its move; without one, the distance itself is scored.
     
     Parameters
     ----------
@@ -39,40 +148,30 @@ def custom_score_3(game, player):
     float
         The heuristic value of the current game state to the specified player.
     """
-    global max_distance_between_players
-    if game.move_count <= 5:
-        #tournament.py tries to initialize two random moves for both players
-        #before calling AB 
-        max_distance_between_players = None
-        
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
+    own_moves = mobility(game, player)
+    opp_moves = mobility(game, game.get_opponent(player))
     
     if opp_moves == 0:
         return float("inf")
     elif own_moves == 0:
         return float("-inf")
     else :  
-        #get the center of the board
-        center_y_pos, center_x_pos = game.height // 2,  game.width // 2
-        #get the current location of active player
-        player_y_pos, player_x_pos = game.get_player_location(player)
-        #get the current location of opponent
-        opponent_y_pos, opponent_x_pos = game.get_player_location(game.get_opponent(player))
-        #compute the Manhattan Distance of player from center
-        curr_player_distance = abs(player_y_pos - opponent_y_pos) + abs(player_x_pos - opponent_x_pos)
-        if max_distance_between_players is None:
-            #first time around return the current distance amplified by the move count
-            score = float(curr_player_distance) * game.move_count
-            max_distance_between_players = curr_player_distance
-        else :    
-            # return the change in distance resulting from current move by subtracting
-            # from previously recorded one. Amplify the score by the move count in the game
-            score = float(max_distance_between_players - curr_player_distance) * game.move_count
-            if curr_player_distance < max_distance_between_players:
-                max_distance_between_players = curr_player_distance
-            
-        return score
+        #Manhattan distance between the player and the opponent
+        curr_player_distance = player_distance(game, player)
+        if curr_player_distance is None:
+            #a player is not placed yet: no distance, score the mobility
+            return float(own_moves - opp_moves)
+        evaluator = getattr(player, 'evaluator', None)
+        root_distance = None if evaluator is None else evaluator.root_distance
+        if root_distance is None:
+            #no reference yet: return the current distance amplified by the move count
+            return float(curr_player_distance) * game.move_count
+        # return the change in distance since the root of the search.
+        # Amplify the score by the move count in the game
+        return float(root_distance - curr_player_distance) * game.move_count
+
+# scores depend on Evaluator.set_root; cached results go stale when the root changes
+custom_score_3.uses_root = True
         
 
 def custom_score(game, player):
@@ -106,8 +205,8 @@ what really matters throught the game ( 65% success against other heuristics)
         The heuristic value of the current game state to the specified player.
     """
     
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
+    own_moves = mobility(game, player)
+    opp_moves = mobility(game, game.get_opponent(player))
     
     score = 0
     if opp_moves == 0:
@@ -155,8 +254,8 @@ This gives results similar to our baseline ID_improved player ( 60% success agai
     if game.is_winner(player):
         return float("inf")
 
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
+    own_moves = mobility(game, player)
+    opp_moves = mobility(game, game.get_opponent(player))
     return float(2 * own_moves - opp_moves)  
     
 def reviewer_custom_score_4(game, player):
@@ -191,14 +290,827 @@ def reviewer_custom_score_4(game, player):
     move_count = game.move_count
 
     # count number of moves available
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
+    own_moves = mobility(game, player)
+    opp_moves = mobility(game, game.get_opponent(player))
 
     # calculate weight
     w = 10 / (move_count + 1)
 
     # return weighted delta of available moves
-    return float(own_moves - (w * opp_moves))  
+    return float(own_moves - (w * opp_moves))
+
+# scores that only depend on move counts and distances, which are the same in
+# every rotation and reflection of a position: searches may share their values
+# between symmetric positions (see AlphaBetaPlayer's `symmetry`)
+custom_score.symmetric = True
+custom_score_2.symmetric = True
+custom_score_3.symmetric = True
+reviewer_custom_score_4.symmetric = True
+
+
+# Transposition table
+# -------------------
+
+_zobrist_keys = {}
+
+def zobrist_keys(width, height):
+    """Random 64 bit Zobrist keys of a board size, built once and shared by all
+    players (with a fixed seed, so hashes are the same in every process).
+
+    Returns
+    -------
+    (list, list, list, int, int)
+        Keys of a blocked cell, of the first player's location and of the
+        second player's location for every cell index `row + col * height`
+        (the layout of `isolation.Board`), the key toggled when the second
+        player is to move, and the key that tells apart the searches of the
+        two players (see `BitBoard.hash_for`).
+    """
+    keys = _zobrist_keys.get((width, height))
+    if keys is None:
+        rnd = random.Random(width * 1000 + height)
+        cells = width * height
+        keys = ([rnd.getrandbits(64) for _ in range(cells)],
+                [rnd.getrandbits(64) for _ in range(cells)],
+                [rnd.getrandbits(64) for _ in range(cells)],
+                rnd.getrandbits(64),
+                rnd.getrandbits(64))
+        _zobrist_keys[(width, height)] = keys
+    return keys
+
+
+class TranspositionTable:
+    """Bounded table of search results keyed by the Zobrist hash of a position.
+
+    The table has a fixed number of slots indexed by the low bits of the key.
+    A slot keeps the result searched deepest, unless it was stored during an
+    earlier move (an older generation), so the table carries over between
+    moves without filling up with stale entries.
+
+    Parameters
+    ----------
+    size : int (optional)
+        Number of slots, rounded up to a power of two.
+    """
+    EXACT, LOWER, UPPER = 0, 1, 2
+
+    def __init__(self, size=1 << 16):
+        self.size = 1 << max(0, size - 1).bit_length()
+        self.mask = self.size - 1
+        self.slots = [None] * self.size
+        self.generation = 0
+
+    def new_search(self):
+        """Start a new generation; entries of earlier searches become replaceable."""
+        self.generation += 1
+
+    def clear(self):
+        self.slots = [None] * self.size
+
+    def lookup(self, key):
+        """Return the (depth, value, flag, move) entry of `key`, or None."""
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry[1:5]
+        return None
+
+    def store(self, key, depth, value, flag, move):
+        """Record the result of searching `key` to `depth` remaining plies.
+        `flag` tells whether `value` is EXACT, a LOWER bound (fail high) or an
+        UPPER bound (fail low); `move` is the best move found, or None.
+        """
+        i = key & self.mask
+        entry = self.slots[i]
+        if entry is None or entry[0] == key or entry[5] != self.generation or depth >= entry[1]:
+            self.slots[i] = (key, depth, value, flag, move, self.generation)
+
+
+# Bitboard game state
+# -------------------
+
+try:
+    popcount = int.bit_count
+except AttributeError:
+    def popcount(mask):
+        return bin(mask).count('1')
+
+if hasattr(math, 'nextafter'):
+    def above(x):
+        """The smallest float greater than `x`: the upper bound of a null window."""
+        return math.nextafter(x, float("inf"))
+else:
+    def above(x):
+        """A float slightly greater than `x`: the upper bound of a null window."""
+        if x == float("-inf"):
+            return -1.7976931348623157e308
+        return x + max(abs(x) * 1e-15, 5e-324)
+
+_knight_tables = {}
+
+def knight_tables(width, height):
+    """Knight move tables of a board size, built once.
+
+    Returns
+    -------
+    (list, list, list)
+        For every cell index `row + col * height`: the list of cells a knight
+        reaches from it, the same cells as a bitmask, and the (row, col) move
+        of the cell.
+    """
+    tables = _knight_tables.get((width, height))
+    if tables is None:
+        directions = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                      (1, -2), (1, 2), (2, -1), (2, 1)]
+        moves = [(i % height, i // height) for i in range(width * height)]
+        neighbors = [[(r + dr) + (c + dc) * height for dr, dc in directions
+                      if 0 <= r + dr < height and 0 <= c + dc < width]
+                     for r, c in moves]
+        masks = [sum(1 << j for j in cells) for cells in neighbors]
+        tables = (neighbors, masks, moves)
+        _knight_tables[(width, height)] = tables
+    return tables
+
+
+class BitBoard:
+    """Compact Isolation game state for the search, built from an
+    `isolation.Board`.
+
+    Blocked cells (including the cells the players stand on) are the bits of
+    one integer, cell `row + col * height` being bit `row + col * height`.
+    Moves are made and taken back in place with `make_move` / `unmake_move`,
+    which also keep the Zobrist hash `key` up to date, instead of copying the
+    board with `forecast_move`.
+
+    The read-only part of the `isolation.Board` interface (`get_legal_moves`,
+    `get_player_location`, `is_winner`, ...) is supported, so score functions
+    can evaluate a BitBoard like a Board. Inside the search moves are cell
+    indices; `cell` and `move` convert to and from (row, col) tuples.
+
+    A symmetric BitBoard also keeps the hashes of all the rotations and
+    reflections of the position up to date (see `symmetry_keys`), and `key`
+    is the smallest of them: the hash of a canonical form that all the
+    symmetric images of the position share. `orientation` maps cells between
+    the board and that canonical form.
+
+    Parameters
+    ----------
+    game : `isolation.Board`
+        The position to copy.
+
+    symmetric : bool (optional)
+        Hash the canonical form of the position rather than the position.
+    """
+    def __init__(self, game, symmetric=False):
+        self.width = game.width
+        self.height = game.height
+        self.neighbors, self.masks, self.moves = knight_tables(self.width, self.height)
+        self.zobrist = zobrist_keys(self.width, self.height)
+        self.move_count = game.move_count
+        # the first player moves at even move counts
+        self.active = game.move_count % 2
+        if self.active:
+            self.players = (game.inactive_player, game.active_player)
+        else:
+            self.players = (game.active_player, game.inactive_player)
+
+        blocked_keys, first_keys, second_keys, side, _ = self.zobrist
+        self.blocked = (1 << (self.width * self.height)) - 1
+        for r, c in game.get_blank_spaces():
+            self.blocked ^= 1 << (r + c * self.height)
+        self.key = 0
+        for i in range(self.width * self.height):
+            if self.blocked >> i & 1:
+                self.key ^= blocked_keys[i]
+        self.locations = [-1, -1]
+        for p, keys in ((0, first_keys), (1, second_keys)):
+            loc = game.get_player_location(self.players[p])
+            if loc is not None:
+                self.locations[p] = self.cell(loc)
+                self.key ^= keys[self.locations[p]]
+        if self.active:
+            self.key ^= side
+        self.symmetry_keys = None
+        self.symmetric_key = None
+        if symmetric:
+            self.symmetry_keys = symmetry_keys(self.width, self.height)
+            _, _, blocked_keys, location_keys, _, side, unpack = self.symmetry_keys
+            packed = 0
+            for i in range(self.width * self.height):
+                if self.blocked >> i & 1:
+                    packed ^= blocked_keys[i]
+            for p in (0, 1):
+                if self.locations[p] >= 0:
+                    packed ^= location_keys[p][self.locations[p]]
+            if self.active:
+                packed ^= side
+            self.symmetric_key = packed
+            self.key = min(unpack(packed))
+        self.undo = []
+
+    def __getstate__(self):
+        # pickled for the root splitting workers: the shared tables are rebuilt
+        # on the other side, and the players are bound again by the worker
+        state = self.__dict__.copy()
+        for name in ('neighbors', 'masks', 'moves', 'zobrist', 'symmetry_keys', 'players'):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.neighbors, self.masks, self.moves = knight_tables(self.width, self.height)
+        self.zobrist = zobrist_keys(self.width, self.height)
+        self.symmetry_keys = None
+        if self.symmetric_key is not None:
+            self.symmetry_keys = symmetry_keys(self.width, self.height)
+        self.players = (None, None)
+
+    def cell(self, move):
+        return move[0] + move[1] * self.height
+
+    def move(self, cell):
+        return self.moves[cell]
+
+    def index(self, player):
+        if player == self.players[0]:
+            return 0
+        if player == self.players[1]:
+            return 1
+        raise RuntimeError("`player` must be an object registered as a player in the current game.")
+
+    def hash_for(self, player):
+        """The Zobrist hash of the position as searched by `player`, so that
+        results stored from the point of view of one player are never read by
+        the other (or by the same agent playing the other side next game).
+        """
+        return self.key ^ self.zobrist[4] if self.index(player) else self.key
+
+    def orientation(self):
+        """Cell maps between the board and the canonical form hashed by `key`.
+
+        Returns
+        -------
+        (list, list)
+            The canonical cell of every board cell, and the board cell of
+            every canonical cell (both the identity unless the board is
+            symmetric).
+        """
+        if self.symmetry_keys is None:
+            identity = symmetry_maps(self.width, self.height)[0]
+            return identity, identity
+        maps, inverses, _, _, _, _, unpack = self.symmetry_keys
+        t = unpack(self.symmetric_key).index(self.key)
+        return maps[t], inverses[t]
+
+    # In place moves
+    def legal_cells(self, player=None):
+        """Legal moves of `player` (default: the active player) as cell indices."""
+        p = self.active if player is None else self.index(player)
+        loc = self.locations[p]
+        blocked = self.blocked
+        if loc < 0:
+            return [i for i in range(self.width * self.height) if not blocked >> i & 1]
+        return [i for i in self.neighbors[loc] if not blocked >> i & 1]
+
+    def count_moves(self, player=None):
+        """Number of legal moves of `player` (default: the active player)."""
+        p = self.active if player is None else self.index(player)
+        loc = self.locations[p]
+        if loc < 0:
+            return self.width * self.height - popcount(self.blocked)
+        return popcount(self.masks[loc] & ~self.blocked)
+
+    def make_move(self, cell):
+        """Move the active player to `cell` (which must be legal), in place."""
+        p = self.active
+        keys = self.zobrist[1 + p]
+        old = self.locations[p]
+        self.undo.append((old, self.key, self.symmetric_key))
+        if self.symmetry_keys is None:
+            key = self.key ^ self.zobrist[0][cell] ^ keys[cell] ^ self.zobrist[3]
+            if old >= 0:
+                key ^= keys[old]
+            self.key = key
+        else:
+            _, _, _, location_keys, enter_keys, _, unpack = self.symmetry_keys
+            packed = self.symmetric_key ^ enter_keys[p][cell]
+            if old >= 0:
+                packed ^= location_keys[p][old]
+            self.symmetric_key = packed
+            self.key = min(unpack(packed))
+        self.blocked |= 1 << cell
+        self.locations[p] = cell
+        self.active = 1 - p
+        self.move_count += 1
+
+    def unmake_move(self):
+        """Take back the last `make_move`."""
+        old, self.key, self.symmetric_key = self.undo.pop()
+        p = 1 - self.active
+        self.blocked ^= 1 << self.locations[p]
+        self.locations[p] = old
+        self.active = p
+        self.move_count -= 1
+
+    # isolation.Board interface
+    @property
+    def active_player(self):
+        return self.players[self.active]
+
+    @property
+    def inactive_player(self):
+        return self.players[1 - self.active]
+
+    def get_opponent(self, player):
+        return self.players[1 - self.index(player)]
+
+    def get_player_location(self, player):
+        loc = self.locations[self.index(player)]
+        return None if loc < 0 else self.moves[loc]
+
+    def get_legal_moves(self, player=None):
+        return [self.moves[i] for i in self.legal_cells(player)]
+
+    def get_blank_spaces(self):
+        return [self.moves[i] for i in range(self.width * self.height) if not self.blocked >> i & 1]
+
+    def move_is_legal(self, move):
+        return (0 <= move[0] < self.height and 0 <= move[1] < self.width and
+                not self.blocked >> self.cell(move) & 1)
+
+    def is_winner(self, player):
+        return player == self.inactive_player and not self.count_moves()
+
+    def is_loser(self, player):
+        return player == self.active_player and not self.count_moves()
+
+    def utility(self, player):
+        if not self.count_moves():
+            if player == self.inactive_player:
+                return float("inf")
+            if player == self.active_player:
+                return float("-inf")
+        return 0.
+
+    def hash(self):
+        return self.key
+
+    def copy(self):
+        board = object.__new__(BitBoard)
+        board.__dict__.update(self.__dict__)
+        board.locations = list(self.locations)
+        board.undo = []
+        return board
+
+    def apply_move(self, move):
+        self.make_move(self.cell(move))
+
+    def forecast_move(self, move):
+        board = self.copy()
+        board.apply_move(move)
+        return board
+
+
+# Symmetries and opening book
+# ---------------------------
+
+_symmetry_maps = {}
+
+def symmetry_maps(width, height):
+    """Cell permutations of the symmetries of a board: the 8 rotations and
+    reflections of a square board, or the 4 reflections of a rectangular one.
+    Knight moves are preserved by all of them.
+
+    Returns
+    -------
+    list of list
+        `maps[t][cell]` is the image of cell index `row + col * height` under
+        symmetry t; map 0 is the identity.
+    """
+    maps = _symmetry_maps.get((width, height))
+    if maps is None:
+        h, w = height - 1, width - 1
+        transforms = [lambda r, c: (r, c), lambda r, c: (h - r, c),
+                      lambda r, c: (r, w - c), lambda r, c: (h - r, w - c)]
+        if width == height:
+            transforms += [lambda r, c: (c, r), lambda r, c: (c, h - r),
+                           lambda r, c: (w - c, r), lambda r, c: (w - c, h - r)]
+        maps = []
+        for transform in transforms:
+            image = []
+            for cell in range(width * height):
+                r, c = transform(cell % height, cell // height)
+                image.append(r + c * height)
+            maps.append(image)
+        _symmetry_maps[(width, height)] = maps
+    return maps
+
+
+_symmetry_keys = {}
+
+def symmetry_keys(width, height):
+    """Zobrist keys of a board size under each of its symmetries, packed into
+    one integer per cell so that a move updates the hashes of all the
+    symmetric images of a position with a single XOR. Slot t (bits 64 t to
+    64 t + 63) holds the key of the image of the cell under symmetry t, so it
+    adds up to the `zobrist_keys` hash of the position mapped by symmetry t.
+    Built once.
+
+    Returns
+    -------
+    (list, list, list, tuple, tuple, int, callable)
+        The `symmetry_maps` and their inverses, the packed keys of a blocked
+        cell, the packed location keys of each player, the packed keys of
+        each player moving to a cell (blocked cell, location and side to move
+        together), the packed side to move key, and a function splitting a
+        packed hash into the tuple of its keys.
+    """
+    keys = _symmetry_keys.get((width, height))
+    if keys is None:
+        maps = symmetry_maps(width, height)
+        cells = width * height
+        inverses = []
+        for image in maps:
+            inverse = [0] * cells
+            for cell, target in enumerate(image):
+                inverse[target] = cell
+            inverses.append(inverse)
+        blocked_keys, first_keys, second_keys, side, _ = zobrist_keys(width, height)
+
+        def pack(table, cell):
+            return sum(table[image[cell]] << (64 * t) for t, image in enumerate(maps))
+
+        blocked = [pack(blocked_keys, cell) for cell in range(cells)]
+        players = tuple([pack(k, cell) for cell in range(cells)] for k in (first_keys, second_keys))
+        packed_side = sum(side << (64 * t) for t in range(len(maps)))
+        enter = tuple([blocked[cell] ^ locations[cell] ^ packed_side for cell in range(cells)]
+                      for locations in players)
+        layout = struct.Struct('<%dQ' % len(maps))
+
+        def unpack(packed):
+            return layout.unpack(packed.to_bytes(layout.size, 'little'))
+
+        keys = (maps, inverses, blocked, players, enter, packed_side, unpack)
+        _symmetry_keys[(width, height)] = keys
+    return keys
+
+
+def canonical_key(board):
+    """Canonical form of a `BitBoard` position for the opening book: the
+    smallest, over all board symmetries, of the blocked cells packed with the
+    locations of the player to move and of its opponent.
+
+    Returns
+    -------
+    (int, int)
+        The 64 bit key, and the symmetry that maps the board to it.
+    """
+    cells = board.width * board.height
+    bits = cells.bit_length()
+    if cells + 2 * bits > 64:
+        raise ValueError("board too large for 64 bit opening book keys")
+    active = board.locations[board.active]
+    inactive = board.locations[1 - board.active]
+    best = None
+    for t, image in enumerate(symmetry_maps(board.width, board.height)):
+        blocked = 0
+        m = board.blocked
+        while m:
+            low = m & -m
+            m ^= low
+            blocked |= 1 << image[low.bit_length() - 1]
+        key = blocked
+        key |= (image[active] + 1 if active >= 0 else 0) << cells
+        key |= (image[inactive] + 1 if inactive >= 0 else 0) << (cells + bits)
+        if best is None or key < best[0]:
+            best = (key, t)
+    return best
+
+
+class OpeningBook:
+    """Book of opening moves, written offline by opening_book.py.
+
+    The file is a header followed by entries sorted by the `canonical_key`
+    of their position, each holding the best move found (in the canonical
+    orientation) and the depth it was searched to. The file is memory-mapped
+    and looked up by bisection, so opening it costs nothing until a lookup
+    touches the pages it needs.
+
+    Parameters
+    ----------
+    path : str
+        Book file.
+    """
+    HEADER = struct.Struct('<8sBBBxI')
+    ENTRY = struct.Struct('<QBB')
+    MAGIC = b'ISOBOOK1'
+
+    def __init__(self, path):
+        with open(path, 'rb') as infile:
+            self.data = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.width, self.height, self.plies, self.count = self.HEADER.unpack_from(self.data)
+        if magic != self.MAGIC:
+            raise ValueError("not an opening book: %s" % path)
+
+    def close(self):
+        self.data.close()
+
+    def entry(self, i):
+        """The (key, cell, depth) of entry i."""
+        return self.ENTRY.unpack_from(self.data, self.HEADER.size + i * self.ENTRY.size)
+
+    def lookup(self, board):
+        """Return the book move of a `BitBoard` position, or None.
+
+        Returns
+        -------
+        ((int, int), int) or None
+            The move and the depth it was searched to.
+        """
+        if (board.width, board.height) != (self.width, self.height) or board.move_count >= self.plies:
+            return None
+        key, t = canonical_key(board)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.entry(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.count:
+            return None
+        found, cell, depth = self.entry(lo)
+        if found != key:
+            return None
+        image = symmetry_maps(board.width, board.height)[t]
+        return board.move(image.index(cell)), depth
+
+    @classmethod
+    def write(cls, path, width, height, plies, entries):
+        """Write a book file.
+
+        Parameters
+        ----------
+        plies : int
+            Positions with fewer moves played than this are in the book.
+
+        entries : dict
+            Canonical key -> (canonical move cell, search depth).
+        """
+        with open(path, 'wb') as outfile:
+            outfile.write(cls.HEADER.pack(cls.MAGIC, width, height, plies, len(entries)))
+            for key in sorted(entries):
+                cell, depth = entries[key]
+                outfile.write(cls.ENTRY.pack(key, cell, min(depth, 255)))
+
+
+# Endgame solver
+# --------------
+
+class EndgameBudgetExceeded(Exception):
+    """Raised when the endgame solver runs out of nodes or time."""
+    pass
+
+
+def reachable_cells(board, cell):
+    """Flood fill: bitmask of the open cells of a `BitBoard` reachable from
+    `cell` by a sequence of knight moves over open cells."""
+    masks = board.masks
+    free = ~board.blocked & ((1 << (board.width * board.height)) - 1)
+    seen = 0
+    frontier = masks[cell] & free
+    while frontier:
+        seen |= frontier
+        step = 0
+        while frontier:
+            low = frontier & -frontier
+            frontier ^= low
+            step |= masks[low.bit_length() - 1]
+        frontier = step & free & ~seen
+    return seen
+
+
+class EndgameSolver:
+    """Exact solver for positions where the two players are in separate
+    regions of the board.
+
+    Once no open cell is reachable by both players, their moves no longer
+    interact, and each player can make exactly as many moves as its longest
+    knight path through its own region. The player to move wins if and only
+    if its path is strictly longer than the opponent's. Longest paths are
+    found by depth-first search memoized on (cell, free cells of the region)
+    bitmasks; the memo is kept between moves of the same game.
+
+    Parameters
+    ----------
+    budget : int (optional)
+        Maximum number of search nodes per solve; when exceeded (or when the
+        timer runs out) the solve is abandoned and the player searches
+        normally.
+
+    memo_size : int (optional)
+        The memo is cleared when it grows beyond this many entries.
+    """
+    def __init__(self, budget=20000, memo_size=1 << 18):
+        self.budget = budget
+        self.memo_size = memo_size
+        self.memo = {}
+        self.nodes = 0
+        self.time_left = None
+        self.threshold = 0.
+
+    def longest_path(self, masks, cell, free):
+        """Length of the longest knight path starting at `cell` through the
+        cells of bitmask `free`, and the first cell of such a path (-1 when
+        there is no move)."""
+        key = (cell, free)
+        known = self.memo.get(key)
+        if known is not None:
+            return known
+        self.nodes += 1
+        if self.nodes > self.budget:
+            raise EndgameBudgetExceeded()
+        if self.time_left is not None and not self.nodes & 255:
+            if self.time_left() < self.threshold:
+                raise EndgameBudgetExceeded()
+        best, first = 0, -1
+        # no path is longer than the number of free cells
+        bound = popcount(free)
+        moves = masks[cell] & free
+        while moves:
+            low = moves & -moves
+            moves ^= low
+            length = 1 + self.longest_path(masks, low.bit_length() - 1, free ^ low)[0]
+            if length > best:
+                best, first = length, low.bit_length() - 1
+                if best == bound:
+                    break
+        self.memo[key] = (best, first)
+        return best, first
+
+    def solve(self, board, player, time_left=None, threshold=0.):
+        """Solve `board` for `player`, who must be the player to move.
+
+        Returns
+        -------
+        ((int, int), float) or None
+            The first move of the longest path of `player` and the game value
+            (inf for a win, -inf for a loss), or None when the players are not
+            separated or the budget ran out.
+        """
+        self.nodes = 0
+        me = board.index(player)
+        own, opp = board.locations[me], board.locations[1 - me]
+        if own < 0 or opp < 0:
+            return None
+        own_region = reachable_cells(board, own)
+        opp_region = reachable_cells(board, opp)
+        if not own_region or own_region & opp_region:
+            return None
+        if len(self.memo) > self.memo_size:
+            self.memo = {}
+        self.time_left, self.threshold = time_left, threshold
+        try:
+            own_length, first = self.longest_path(board.masks, own, own_region)
+            opp_length, _ = self.longest_path(board.masks, opp, opp_region)
+        except EndgameBudgetExceeded:
+            return None
+        finally:
+            self.time_left = None
+        return board.move(first), float("inf") if own_length > opp_length else float("-inf")
+
+
+# Time management
+# ---------------
+
+class TimeManager:
+    """Predicts the cost of the next iteration of iterative deepening from
+    the times of the previous ones, so that an iteration which cannot finish
+    before the timer runs out is not started at all.
+
+    The next iteration is expected to take the last one's time multiplied by
+    the growth between the last two iterations, or by the root branching
+    factor while there is only one, clamped to [1, max(branching, 2)].
+    """
+    def __init__(self):
+        self.times = []
+        self.branching = 8
+
+    def start(self, branching):
+        """Start a new move with `branching` legal moves at the root."""
+        self.times = []
+        self.branching = max(branching, 1)
+
+    def record(self, elapsed):
+        """Record the time of a completed iteration, in milliseconds."""
+        self.times.append(elapsed)
+
+    def predict(self):
+        """Expected time of the next iteration, in milliseconds."""
+        if not self.times:
+            return 0.
+        last = self.times[-1]
+        if len(self.times) >= 2 and self.times[-2] > 0:
+            growth = last / self.times[-2]
+        else:
+            growth = self.branching
+        return last * min(max(growth, 1.), max(self.branching, 2.))
+
+    def can_start(self, time_left, threshold):
+        """Whether the next iteration is expected to end before `time_left`
+        falls under `threshold` (both in milliseconds)."""
+        return self.predict() < time_left - threshold
+
+
+# Search statistics
+# -----------------
+
+class SearchStats:
+    """Instrumentation of the search of one move: nodes visited per ply,
+    cutoffs, transposition table and evaluation cache use, and the time and
+    size of every completed iteration. Only nodes searched in this process
+    are counted (not those of root splitting workers).
+
+    Parameters
+    ----------
+    player : object
+        The searching player; its evaluation cache counters are read at the
+        start and the end of the move.
+
+    game : `isolation.Board`
+        The position searched.
+    """
+    def __init__(self, player, game):
+        self.move_count = game.move_count
+        self.nodes = []
+        self.cutoffs = 0
+        self.tt_probes = self.tt_hits = self.tt_cutoffs = 0
+        self.iterations = []
+        self.depth = 0
+        self.counted = 0
+        self.endgame_nodes = 0
+        self.book = False
+        self.pvs_researches = self.aspiration_researches = 0
+        cache = getattr(getattr(player, 'evaluator', None), 'cache', None)
+        self.cache = cache
+        self.cache_start = (cache.hits, cache.misses) if cache is not None else (0, 0)
+
+    def node(self, ply):
+        """Count a node visited `ply` plies below the root."""
+        nodes = self.nodes
+        while len(nodes) <= ply:
+            nodes.append(0)
+        nodes[ply] += 1
+
+    def iteration(self, depth, elapsed):
+        """Record a completed iteration to `depth` that took `elapsed` ms."""
+        total = sum(self.nodes)
+        self.depth = depth
+        self.iterations.append({'depth': depth, 'ms': round(elapsed, 3), 'nodes': total - self.counted})
+        self.counted = total
+
+    def as_dict(self, move=None):
+        """The statistics as a dict. `ebf` is the effective branching factor
+        of the deepest iteration, the depth-th root of its node count.
+        """
+        ebf = None
+        if self.iterations:
+            last = self.iterations[-1]
+            if last['depth'] > 0 and last['nodes'] > 0:
+                ebf = round(last['nodes'] ** (1. / last['depth']), 3)
+        cache_hits = cache_misses = 0
+        if self.cache is not None:
+            cache_hits = self.cache.hits - self.cache_start[0]
+            cache_misses = self.cache.misses - self.cache_start[1]
+        return {
+            'move_count': self.move_count,
+            'move': list(move) if move is not None else None,
+            'depth': self.depth,
+            'nodes': sum(self.nodes),
+            'nodes_per_ply': list(self.nodes),
+            'cutoffs': self.cutoffs,
+            'ebf': ebf,
+            'iterations': self.iterations,
+            'tt_probes': self.tt_probes,
+            'tt_hits': self.tt_hits,
+            'tt_cutoffs': self.tt_cutoffs,
+            'tt_hit_rate': round(self.tt_hits / self.tt_probes, 4) if self.tt_probes else None,
+            'eval_cache_hits': cache_hits,
+            'eval_cache_misses': cache_misses,
+            'pvs_researches': self.pvs_researches,
+            'aspiration_researches': self.aspiration_researches,
+            'endgame_nodes': self.endgame_nodes,
+            'book': self.book,
+        }
+
+    def finish(self, player, move):
+        """Publish the statistics of the move as `player.search_stats` and
+        append them as a JSON line to `player.stats_log`, if set."""
+        record = self.as_dict(move)
+        player.search_stats = record
+        if player.stats_log:
+            with open(player.stats_log, 'a') as outfile:
+                outfile.write(json.dumps(record) + '\n')
+        return record
 
 
 class IsolationPlayer:
@@ -234,7 +1146,24 @@ class MinimaxPlayer(IsolationPlayer):
     """Game-playing agent that chooses a move using depth-limited minimax
     search. You must finish and test this player to make sure it properly uses
     minimax to return a good move before the search time limit expires.
+
+    Parameters
+    ----------
+    stats : bool (optional)
+        Collect `SearchStats` of every move into `search_stats`.
+
+    stats_log : str (optional)
+        Also append them to this JSON lines file (implies `stats`).
     """
+    def __init__(self, search_depth=3, score_fn=custom_score, timeout=10.,
+                 stats=False, stats_log=None):
+        super().__init__(search_depth, score_fn, timeout)
+        self.evaluator = Evaluator()
+        self.collect_stats = stats or stats_log is not None
+        self.stats_log = stats_log
+        self.stats = None
+        # statistics of the last move, see SearchStats.as_dict
+        self.search_stats = None
     
     def terminal_test(self, game, depth):
         if self.time_left() < self.TIMER_THRESHOLD:
@@ -244,28 +1173,33 @@ class MinimaxPlayer(IsolationPlayer):
             return True
         return False
    
-    def min_value(self,game, depth):
+    # `ply` is the distance from the root of the search, for the statistics
+    def min_value(self,game, depth, ply=1):
         if self.time_left() < self.TIMER_THRESHOLD:
             raise SearchTimeout()
+        if self.stats is not None:
+            self.stats.node(ply)
             
         if self.terminal_test(game, depth):  
             return self.score(game, self)
         
         v = float('inf')
         for a in game.get_legal_moves():
-            v = min(v, self.max_value(game.forecast_move(a), depth - 1))
+            v = min(v, self.max_value(game.forecast_move(a), depth - 1, ply + 1))
         return v
     
-    def max_value(self, game, depth):
+    def max_value(self, game, depth, ply=0):
         if self.time_left() < self.TIMER_THRESHOLD:
             raise SearchTimeout()
+        if self.stats is not None:
+            self.stats.node(ply)
             
         if self.terminal_test(game, depth):
             return self.score(game, self)
         
         v = float('-inf')
         for a in game.get_legal_moves():
-            v = max(v, self.min_value(game.forecast_move(a), depth - 1))
+            v = max(v, self.min_value(game.forecast_move(a), depth - 1, ply + 1))
         return v
 
   
@@ -298,6 +1232,8 @@ class MinimaxPlayer(IsolationPlayer):
             (-1, -1) if there are no available legal moves.
         """
         self.time_left = time_left
+        self.evaluator.set_root(game, self)
+        self.stats = SearchStats(self, game) if self.collect_stats else None
 
         # Initialize the best move so that this function returns something
         # in case the search fails due to timeout
@@ -306,11 +1242,16 @@ class MinimaxPlayer(IsolationPlayer):
         try:
             # The try/except block will automatically catch the exception
             # raised when the timer is about to expire.
+            started = time_left()
             best_move = self.minimax(game, self.search_depth)
+            if self.stats is not None:
+                self.stats.iteration(self.search_depth, started - time_left())
 
         except SearchTimeout:
             pass  # Handle any actions required after timeout as needed
         
+        if self.stats is not None:
+            self.stats.finish(self, best_move)
         # Return the best move from the last completed search iteration
         return best_move
 
@@ -360,7 +1301,7 @@ class MinimaxPlayer(IsolationPlayer):
             raise SearchTimeout()
         # Body of minimax: as defined in AIMA
         return max(game.get_legal_moves(),
-               key=lambda a: self.min_value(game.forecast_move(a), depth -1), default=(-1,-1))  
+               key=lambda a: self.min_value(game.forecast_move(a), depth -1, 1), default=(-1,-1))  
                 
             
 
@@ -368,62 +1309,314 @@ class AlphaBetaPlayer(IsolationPlayer):
     """Game-playing agent that chooses a move using iterative deepening minimax
     search with alpha-beta pruning. You must finish and test this player to
     make sure it returns a good move before the search time limit expires.
-    """
 
-    def terminal_test(self, game, depth, depthLimit):
+    The search runs on a `BitBoard` copy of the game, making and unmaking
+    moves in place. Search results are kept in a Zobrist-hashed
+    `TranspositionTable` that is shared by the iterations of iterative
+    deepening and by consecutive moves. Moves are searched in the order most
+    likely to cause a cutoff: the best move of the previous iteration (at the
+    root) or of the table entry, then the killer moves of the ply, then by
+    the history heuristic.
+
+    With more than one worker, each iteration searches the best root move
+    first and then splits the other root moves over a process pool (see
+    `split_alphabeta`). Call `close()` to shut the pool down.
+
+    Parameters
+    ----------
+    tt_size : int (optional)
+        Number of transposition table slots; 0 or None searches without a table.
+
+    workers : int (optional)
+        Number of processes searching root moves; 1 searches in this process.
+
+    manage_time : bool (optional)
+        Skip iterations the `TimeManager` predicts cannot finish in time, and
+        stop deepening once the game is decided. Forced moves are always
+        played without searching.
+
+    stats : bool (optional)
+        Collect `SearchStats` of every move into `search_stats`.
+
+    stats_log : str (optional)
+        Also append them to this JSON lines file (implies `stats`).
+
+    endgame_budget : int (optional)
+        Node budget of the `EndgameSolver` that plays positions where the
+        players are separated; 0 or None always searches.
+
+    book : str (optional)
+        Opening book file written by opening_book.py, opened on first use.
+        Positions found in it are played without searching.
+
+    pvs : bool (optional)
+        Search with principal variation search (null windows for all but
+        the first move) rather than plain alpha-beta.
+
+    aspiration : float (optional)
+        Half width of the aspiration window around the previous iteration's
+        root value; 0 or None searches every iteration with the full window.
+
+    symmetry : bool (optional)
+        Key the transposition table and the evaluation cache on the canonical
+        form of positions over the board symmetries, so that rotated and
+        reflected positions share entries. Only valid for a score function
+        that is the same on symmetric positions; by default on for score
+        functions marked `symmetric`. Only searches from the first
+        `SYMMETRY_PLIES` moves are canonicalized: later, the symmetric images
+        of a position are no longer reachable from the root.
+    """
+    SYMMETRY_PLIES = 4
+
+    def __init__(self, search_depth=3, score_fn=custom_score, timeout=10., tt_size=1 << 16,
+                 workers=1, manage_time=True, stats=False, stats_log=None,
+                 endgame_budget=20000, book=None, pvs=True, aspiration=1., symmetry=None):
+        super().__init__(search_depth, score_fn, timeout)
+        if symmetry is None:
+            symmetry = getattr(score_fn, 'symmetric', False)
+        self.symmetry = symmetry
+        self.pvs = pvs
+        self.aspiration = aspiration
+        self.book_path = book
+        self.book = None
+        self.endgame = EndgameSolver(endgame_budget) if endgame_budget else None
+        self.collect_stats = stats or stats_log is not None
+        self.stats_log = stats_log
+        self.stats = None
+        # statistics of the last move, see SearchStats.as_dict
+        self.search_stats = None
+        self.timer = TimeManager() if manage_time else None
+        # value and best move of the root moves searched so far in the current iteration
+        self.root_value = None
+        self.partial_move = None
+        self.tt = TranspositionTable(tt_size) if tt_size else None
+        # best move of the last completed iteration
+        self.pv_move = None
+        # two killer moves per ply, and history scores per (side, cell)
+        self.killers = []
+        self.history = {}
+        self.evaluator = Evaluator()
+        self.workers = workers
+        self.pool = None
+        if workers > 1:
+            # best root value found so far, and the number of the iteration it belongs to
+            self.root_alpha = multiprocessing.Value('d', float('-inf'))
+            self.root_iteration = multiprocessing.Value('l', 0, lock=False)
+            self.pool = multiprocessing.Pool(workers, _init_root_worker,
+                                             (self, self.root_alpha, self.root_iteration))
+
+    def __getstate__(self):
+        # workers get a copy of the player without the pool and the timer of
+        # this process; they search with the deadline passed along each task
+        state = self.__dict__.copy()
+        for name in ('pool', 'time_left', 'root_alpha', 'root_iteration', 'book'):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.pool = None
+        self.time_left = None
+        self.book = None
+        self.stats = None
+        self.collect_stats = False
+        self.stats_log = None
+
+    def set_root(self, game):
+        """Record the root of the search in the evaluator. Cached scores and
+        search results go stale when a score function depending on the root
+        (marked `uses_root`) gets a different root state.
+        """
+        if self.evaluator.set_root(game, self) and getattr(self.score, 'uses_root', False):
+            if self.evaluator.cache is not None:
+                self.evaluator.cache.clear()
+            if self.tt is not None:
+                self.tt.clear()
+
+    def bitboard(self, game):
+        """The `BitBoard` of `game` to search, symmetric in the opening."""
+        return BitBoard(game, self.symmetry and game.move_count < self.SYMMETRY_PLIES)
+
+    def close(self):
+        """Shut down the worker pool and close the opening book, if any."""
+        if self.book is not None:
+            self.book.close()
+            self.book = None
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def terminal_test(self, game, depth, depthLimit, moves=None):
         if self.time_left() < self.TIMER_THRESHOLD:
             raise SearchTimeout()
         #if no legal moves left     
-        terminalNode = not game.get_legal_moves()
+        terminalNode = not (game.get_legal_moves() if moves is None else moves)
         #if we have crossed the depth limit
         if depth >= depthLimit  or terminalNode:
             return True
         return False
     
     # Functions used by alphabeta
-    def max_value(self, game, alpha, beta, depth, depthLimit):
+    def order_moves(self, moves, first, depth, side):
+        """Sort `moves` for searching: `first` (a principal variation or table
+        move), then the killer moves of ply `depth`, then the rest by history
+        score of `side` (0 for our moves, 1 for the opponent's).
+        """
+        killers = self.killers[depth] if depth < len(self.killers) else ()
+        history = self.history
+
+        def rank(move):
+            if move == first:
+                return (2, 0)
+            if move in killers:
+                return (1, 0)
+            return (0, history.get((side, move), 0))
+
+        moves.sort(key=rank, reverse=True)
+        return moves
+
+    def record_cutoff(self, move, depth, depthLimit, side):
+        """Remember a move that caused a cutoff at ply `depth` as a killer and
+        credit it in the history table, weighted by the remaining depth.
+        """
+        if self.stats is not None:
+            self.stats.cutoffs += 1
+        while len(self.killers) <= depth:
+            self.killers.append([])
+        killers = self.killers[depth]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        self.history[(side, move)] = self.history.get((side, move), 0) + (depthLimit - depth) ** 2
+
+    def probe(self, key, alpha, beta, depth, depthLimit):
+        """Look `key` up in the transposition table.
+
+        Returns
+        -------
+        (float, float, float, (int, int))
+            The stored value if it was searched at least as deep and decides
+            the window (None otherwise), the (alpha, beta) window narrowed by a
+            stored bound, and the stored best move to be searched first.
+        """
+        entry = self.tt.lookup(key)
+        stats = self.stats
+        if stats is not None:
+            stats.tt_probes += 1
+        if entry is None:
+            return None, alpha, beta, None
+        if stats is not None:
+            stats.tt_hits += 1
+        stored_depth, value, flag, move = entry
+        if stored_depth >= depthLimit - depth:
+            if flag != TranspositionTable.EXACT:
+                if flag == TranspositionTable.LOWER:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+            if flag == TranspositionTable.EXACT or alpha >= beta:
+                if stats is not None:
+                    stats.tt_cutoffs += 1
+                return value, alpha, beta, move
+        return None, alpha, beta, move
+
+    def negamax(self, game, alpha, beta, depth, depthLimit):
+        """Principal variation search of a `BitBoard` position in negamax form:
+        values are from the point of view of the player to move, and a child's
+        value is the negation of its value for the opponent.
+
+        The first (best ordered) move is searched with the full window, the
+        others with a null window that only tests whether they beat alpha;
+        a move that does is searched again with the full window. Values are
+        fail-soft: outside (alpha, beta) they are bounds.
+        """
         if self.time_left() < self.TIMER_THRESHOLD:
             raise SearchTimeout()
+        stats = self.stats
+        if stats is not None:
+            stats.node(depth)
+        side = 0 if game.active_player is self else 1
+
+        tt_move = None
+        if self.tt is not None:
+            key = game.hash_for(self)
+            value, alpha, beta, tt_move = self.probe(key, alpha, beta, depth, depthLimit)
+            if value is not None:
+                return value
+            #table moves are stored as cells of the canonical form of the position
+            to_canonical, from_canonical = game.orientation()
+            if tt_move is not None:
+                tt_move = from_canonical[tt_move]
+        alpha_in = alpha
         
         #if no legal moves or reached depthlimit return the score
-        if self.terminal_test(game, depth, depthLimit):
-            return self.score(game, self)
+        moves = game.legal_cells()
+        if self.terminal_test(game, depth, depthLimit, moves):
+            v = self.evaluator.evaluate(self.score, game, self)
+            return -v if side else v
         
         v = float('-inf')
-        for a in game.get_legal_moves():
-            #compute the max of min values at the next level
-            v = max(v, self.min_value(game.forecast_move(a),
-                                 alpha, beta, depth + 1, depthLimit))    
+        best = None
+        for a in self.order_moves(moves, tt_move, depth, side):
+            game.make_move(a)
+            if best is None or not self.pvs:
+                child = -self.negamax(game, -beta, -alpha, depth + 1, depthLimit)
+            else:
+                #null window: does this move beat alpha?
+                child = -self.negamax(game, -above(alpha), -alpha, depth + 1, depthLimit)
+                if alpha < child < beta:
+                    if stats is not None:
+                        stats.pvs_researches += 1
+                    child = -self.negamax(game, -beta, -alpha, depth + 1, depthLimit)
+            game.unmake_move()
+            if child > v or best is None:
+                v, best = max(v, child), a
             # found a value greater than or equal to Beta so no need to
             # explore the remaining moves
             if v >= beta:
-                return v
-            #Alpha is the maximum lower bound 
+                self.record_cutoff(a, depth, depthLimit, side)
+                break
             alpha = max(alpha, v)
+        if self.tt is not None:
+            flag = (TranspositionTable.LOWER if v >= beta else
+                    TranspositionTable.UPPER if v <= alpha_in else TranspositionTable.EXACT)
+            self.tt.store(key, depthLimit - depth, v, flag, to_canonical[best])
         return v
 
-    def min_value(self,game, alpha, beta, depth, depthLimit):
-        if self.time_left() < self.TIMER_THRESHOLD:
-            raise SearchTimeout()
-            
-        #if no legal moves or reached depthlimit return the score
-        if self.terminal_test(game, depth, depthLimit):
-            return self.score(game, self)    
-        
-        v = float('inf')
-        for a in game.get_legal_moves():
-            #compute the min of max values at the next level 
-            v = min(v, self.max_value(game.forecast_move(a),
-                                 alpha, beta, depth + 1, depthLimit))
-            # found a value less than or equal to Alpha so no need to
-            # explore the remaining moves
-            if v <= alpha:
-                return v
-            #Beta is the minimum upper bound 
-            beta = min(beta, v)
-        return v
+    def max_value(self, game, alpha, beta, depth, depthLimit):
+        """Value of a position with this player to move."""
+        if not isinstance(game, BitBoard):
+            game = self.bitboard(game)
+        return self.negamax(game, alpha, beta, depth, depthLimit)
+
+    def min_value(self, game, alpha, beta, depth, depthLimit):
+        """Value, for this player, of a position with the opponent to move."""
+        if not isinstance(game, BitBoard):
+            game = self.bitboard(game)
+        return -self.negamax(game, -beta, -alpha, depth, depthLimit)
+
+    def aspiration_search(self, game, depth):
+        """Search to `depth` with an aspiration window centered on the root
+        value of the previous iteration, widened (4 times per fail) and
+        searched again while the value falls outside it. The first iteration,
+        proven values and root splitting use the full window.
+        """
+        previous = self.root_value
+        if (not self.aspiration or self.pool is not None or previous is None or
+                previous in (float("inf"), float("-inf"))):
+            return self.alphabeta(game, depth)
+        delta = self.aspiration
+        while delta < 64 * self.aspiration:
+            alpha, beta = previous - delta, previous + delta
+            move = self.alphabeta(game, depth, alpha, beta)
+            if alpha < self.root_value < beta:
+                return move
+            if self.stats is not None:
+                self.stats.aspiration_researches += 1
+            delta *= 4
+        return self.alphabeta(game, depth)
 
-    
     def get_move(self, game, time_left):
         """Search for the best move from the available legal moves and return a
         result before the time limit expires.
@@ -455,27 +1648,92 @@ class AlphaBetaPlayer(IsolationPlayer):
             (-1, -1) if there are no available legal moves.
         """
         self.time_left = time_left
+        if self.tt is not None:
+            self.tt.new_search()
+        self.set_root(game)
+        self.stats = SearchStats(self, game) if self.collect_stats else None
+        # killer moves belong to the previous position, history is aged
+        self.pv_move = None
+        self.killers = []
+        self.history = dict((k, v // 2) for k, v in self.history.items() if v > 1)
         
         # Initialize the best move so that this function returns something
         # in case the search fails due to timeout
         best_move = (-1, -1)
+        legal_moves = game.get_legal_moves()
+        if len(legal_moves) <= 1:
+            #no choice to make: forced move, or no move at all
+            best_move = legal_moves[0] if legal_moves else best_move
+            self.last_selected_move = best_move
+            if self.stats is not None:
+                self.stats.finish(self, best_move)
+            return best_move
+        if self.book_path is not None:
+            #opening positions are looked up in the book
+            if self.book is None:
+                self.book = OpeningBook(self.book_path)
+            found = None
+            if game.move_count < self.book.plies:
+                found = self.book.lookup(BitBoard(game))
+            if found is not None and found[0] in legal_moves:
+                best_move = found[0]
+                self.last_selected_move = best_move
+                if self.stats is not None:
+                    self.stats.book = True
+                    self.stats.finish(self, best_move)
+                return best_move
+        if self.endgame is not None:
+            #players in separate regions: solve the game exactly
+            solved = self.endgame.solve(BitBoard(game), self, time_left, 2 * self.TIMER_THRESHOLD)
+            if self.stats is not None:
+                self.stats.endgame_nodes = self.endgame.nodes
+            if solved is not None:
+                best_move, self.root_value = solved
+                self.last_selected_move = best_move
+                if self.stats is not None:
+                    self.stats.finish(self, best_move)
+                return best_move
+        if self.timer is not None:
+            self.timer.start(len(legal_moves))
+
         d = 0
+        self.partial_move = None
+        self.root_value = None
         try:
             # The try/except block will automatically catch the exception
             # raised when the timer is about to expire.
             # the maximum depth to search until end-game
             limit = (game.width * game.height) + 1
             for d in range(1,limit):
-                temp_move = self.alphabeta(game, d)
+                started = self.time_left()
+                temp_move = self.aspiration_search(game, d)
                 if temp_move != (-1,-1):
                     #store the best move so far to be returned 
                     #either upon search till end-game or a timeout
+                    #and search it first in the next iteration
                     best_move = temp_move
+                    self.pv_move = temp_move
+                self.partial_move = None
+                elapsed = started - self.time_left()
+                if self.stats is not None:
+                    self.stats.iteration(d, elapsed)
+                if self.timer is not None:
+                    #stop once the game is decided, or when the next
+                    #iteration is not expected to finish in time
+                    if self.root_value in (float("inf"), float("-inf")):
+                        break
+                    self.timer.record(elapsed)
+                    if not self.timer.can_start(self.time_left(), self.TIMER_THRESHOLD):
+                        break
 
         except SearchTimeout:
-            pass  # Handle any actions required after timeout as needed
+            # the interrupted iteration searched the previous best move first,
+            # so a move that beat it is better at the deeper depth
+            if self.partial_move is not None:
+                best_move = self.partial_move
         
-        #used by custom score 3
+        if self.stats is not None:
+            self.stats.finish(self, best_move)
         self.last_selected_move = best_move
         # Return the best move from the last completed search iteration
         return best_move
@@ -528,25 +1786,130 @@ class AlphaBetaPlayer(IsolationPlayer):
         if self.time_left() < self.TIMER_THRESHOLD:
             raise SearchTimeout()
         
-        legal_moves = game.get_legal_moves()
-        best_action = None
+        if self.stats is not None:
+            self.stats.node(0)
+        #search on a bitboard copy, making and unmaking moves in place
+        board = game if isinstance(game, BitBoard) else self.bitboard(game)
+        legal_moves = board.legal_cells()
         
         #if no legal moves left exit
         if len(legal_moves) == 0:
             return (-1, -1)
-        else:
-            #start with first one
-            best_action = legal_moves[0]
- 
-        for a in game.get_legal_moves():
-            v = self.min_value(game.forecast_move(a), alpha, beta, 1, depth)
-            if v > alpha:
-                #adjust Alpha to the maximum of min values
-                alpha = v
-                best_action = a
-        return best_action  
-    
-    
-    
-   
-        
+
+        first = None if self.pv_move is None else board.cell(self.pv_move)
+        self.root_value = None
+        if self.pool is not None and len(legal_moves) > 1:
+            return self.split_alphabeta(board, self.order_moves(legal_moves, first, 0, 0), depth, alpha)
+        best_action = None
+        best_value = float("-inf")
+        for a in self.order_moves(legal_moves, first, 0, 0):
+            board.make_move(a)
+            if best_action is None or not self.pvs:
+                v = -self.negamax(board, -beta, -alpha, 1, depth)
+            else:
+                v = -self.negamax(board, -above(alpha), -alpha, 1, depth)
+                if alpha < v < beta:
+                    if self.stats is not None:
+                        self.stats.pvs_researches += 1
+                    v = -self.negamax(board, -beta, -alpha, 1, depth)
+            board.unmake_move()
+            if best_action is None or v > best_value:
+                #start with the first one searched
+                best_value, best_action = v, a
+                if v > alpha:
+                    #a value inside the window is exact, a safe move to fall back on
+                    self.partial_move = board.move(a)
+            if best_value >= beta:
+                break
+            #adjust Alpha to the best value so far
+            alpha = max(alpha, best_value)
+        self.root_value = best_value
+        return board.move(best_action)
+
+    def split_alphabeta(self, board, legal_moves, depth, alpha=float("-inf")):
+        """Root splitting: search the first of the ordered `legal_moves` in
+        this process, then the others in parallel on the worker pool.
+
+        The workers share the best root value found so far, and each task
+        starts its search with it as alpha. A task returns whether its value
+        beat that alpha; if not, the value is only an upper bound and the move
+        is not better. The iteration counts only if every task finishes before
+        the deadline, otherwise SearchTimeout is raised and `get_move` keeps
+        the move of the last complete iteration.
+
+        Parameters
+        ----------
+        board : `BitBoard`
+            The root position, with this player to move.
+
+        legal_moves : list
+            The root moves as cells, best first.
+
+        Returns
+        -------
+        (int, int)
+            The best move at this depth.
+        """
+        best_action = legal_moves[0]
+        board.make_move(best_action)
+        best_value = self.min_value(board, alpha, float("inf"), 1, depth)
+        board.unmake_move()
+        self.partial_move = board.move(best_action)
+
+        with self.root_alpha.get_lock():
+            self.root_iteration.value += 1
+            self.root_alpha.value = max(alpha, best_value)
+        iteration = self.root_iteration.value
+        deadline = time.time() + self.time_left() / 1000.
+        seat = board.index(self)
+        tasks = [self.pool.apply_async(_search_root_move,
+                                       (board, seat, a, depth, deadline, iteration))
+                 for a in legal_moves[1:]]
+        for task in tasks:
+            wait = (self.time_left() - self.TIMER_THRESHOLD) / 1000.
+            if wait <= 0:
+                raise SearchTimeout()
+            try:
+                a, v, exact = task.get(wait)
+            except multiprocessing.TimeoutError:
+                raise SearchTimeout()
+            if v is None:
+                raise SearchTimeout()
+            if exact and v > best_value:
+                best_value, best_action = v, a
+                self.partial_move = board.move(best_action)
+        self.root_value = best_value
+        return board.move(best_action)
+
+
+# Root splitting workers
+# ----------------------
+
+_root_worker = None
+
+def _init_root_worker(player, root_alpha, root_iteration):
+    global _root_worker
+    _root_worker = (player, root_alpha, root_iteration)
+
+
+def _search_root_move(board, seat, cell, depth, deadline, iteration):
+    """Search root move `cell` of `board` to `depth` in a worker, starting
+    from the shared root alpha. Returns (cell, value, exact), value None if
+    the search ran out of time.
+    """
+    player, root_alpha, root_iteration = _root_worker
+    # the opponent only needs an identity of its own for the score functions
+    opponent = object()
+    board.players = (player, opponent) if seat == 0 else (opponent, player)
+    player.set_root(board)
+    player.time_left = lambda: (deadline - time.time()) * 1000
+    alpha = root_alpha.value
+    board.make_move(cell)
+    try:
+        v = player.min_value(board, alpha, float("inf"), 1, depth)
+    except SearchTimeout:
+        return cell, None, False
+    with root_alpha.get_lock():
+        if root_iteration.value == iteration and v > root_alpha.value:
+            root_alpha.value = v
+    return cell, v, v > alpha
@@ -0,0 +1,113 @@
+"""
+Build an opening book for game_agent.AlphaBetaPlayer.
+
+Every position of the first few plies is reduced to one representative per
+board symmetry (canonical_key in game_agent.py), searched deeply by
+AlphaBetaPlayer with a fixed time per position, in parallel across a process
+pool, and the best moves are written to a book file:
+
+    python opening_book.py -o book.bin --plies 3 --seconds 2
+
+The player then plays those positions without searching:
+
+    AlphaBetaPlayer(score_fn=custom_score, book='book.bin')
+
+Like tournament.py this needs the isolation package of the project.
+"""
+import argparse
+import multiprocessing
+import sys
+import time
+
+import game_agent
+from game_agent import AlphaBetaPlayer, BitBoard, OpeningBook, canonical_key, symmetry_maps
+from isolation import Board
+
+scores = ('custom_score', 'custom_score_2', 'custom_score_3', 'reviewer_custom_score_4')
+
+
+def opening_positions(plies, width=7, height=7):
+    """
+    The positions with fewer than `plies` moves played, one per symmetry class.
+    Returns:
+        A dict of canonical key -> the list of moves that reaches the position.
+    """
+    player, opponent = object(), object()
+    positions = {}
+    frontier = [[]]
+    for _ in range(plies):
+        following = []
+        for moves in frontier:
+            game = Board(player, opponent, width, height)
+            for move in moves:
+                game.apply_move(move)
+            key, _ = canonical_key(BitBoard(game))
+            if key in positions:
+                continue
+            positions[key] = moves
+            following.extend(moves + [move] for move in game.get_legal_moves())
+        frontier = following
+    return positions
+
+
+_player = None
+
+def _init_worker(score, seconds, timeout):
+    global _player
+    _player = (AlphaBetaPlayer(score_fn=getattr(game_agent, score), timeout=timeout, stats=True),
+               seconds * 1000.)
+
+
+def _search_position(moves):
+    """Search the position reached by `moves`. Returns (key, canonical move cell, depth)."""
+    player, budget = _player
+    game = Board(player, object()) if len(moves) % 2 == 0 else Board(object(), player)
+    for move in moves:
+        game.apply_move(move)
+    start = time.perf_counter()
+    move = player.get_move(game.copy(), lambda: budget - (time.perf_counter() - start) * 1000)
+    board = BitBoard(game)
+    key, t = canonical_key(board)
+    return key, symmetry_maps(board.width, board.height)[t][board.cell(move)], player.search_stats['depth']
+
+
+def build(path, plies=3, seconds=2., workers=None, score='custom_score', timeout=10.,
+          width=7, height=7):
+    """
+    Search every opening position and write the book to `path`.
+    Returns:
+        The number of positions in the book.
+    """
+    positions = opening_positions(plies, width, height)
+    entries = {}
+    start = time.time()
+    with multiprocessing.Pool(workers, _init_worker, (score, seconds, timeout)) as pool:
+        results = pool.imap_unordered(_search_position, positions.values())
+        for done, (key, cell, depth) in enumerate(results, 1):
+            entries[key] = (cell, depth)
+            sys.stderr.write('\r%d/%d positions, %.0fs' % (done, len(positions), time.time() - start))
+    sys.stderr.write('\n')
+    OpeningBook.write(path, width, height, plies, entries)
+    return len(entries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build an opening book for AlphaBetaPlayer.')
+    parser.add_argument('-o', '--output', default='book.bin', help='book file (default: book.bin)')
+    parser.add_argument('--plies', type=int, default=3,
+                        help='book the positions with fewer moves played (default: 3)')
+    parser.add_argument('--seconds', type=float, default=2., help='search time per position (default: 2)')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--score', choices=scores, default='custom_score')
+    parser.add_argument('--size', type=int, nargs=2, default=(7, 7), metavar=('WIDTH', 'HEIGHT'))
+    args = parser.parse_args(argv)
+
+    count = build(args.output, args.plies, args.seconds, args.workers, args.score,
+                  width=args.size[0], height=args.size[1])
+    print('%d positions written to %s' % (count, args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""
+Headless Isolation tournament, played in parallel.
+
+Every pair of agents plays a number of games. Each opening (two random
+moves, as in tournament.py) comes from a fixed seed and is played twice, with
+the seats swapped. Games are spread over a process pool, and every result is
+appended to a JSON lines file as soon as it comes in. An interrupted run
+resumes where it stopped, and a finished one can be reported again:
+
+    python tournament_runner.py --games 40 --time-limit 150 -o results.jsonl
+    python tournament_runner.py --report results.jsonl
+
+The report gives the win rate of every agent with a 95% Wilson confidence
+interval and Elo ratings fitted to all the games (Bradley-Terry), relative to
+the first agent.
+
+Like tournament.py this needs the isolation package and sample_players.py of
+the project.
+"""
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+import game_agent
+from game_agent import AlphaBetaPlayer
+from isolation import Board
+from sample_players import RandomPlayer, improved_score
+
+agents = {
+    'Random': RandomPlayer,
+    'AB_Improved': lambda: AlphaBetaPlayer(score_fn=improved_score, symmetry=True),
+    'AB_Custom': lambda: AlphaBetaPlayer(score_fn=game_agent.custom_score),
+    'AB_Custom_2': lambda: AlphaBetaPlayer(score_fn=game_agent.custom_score_2),
+    'AB_Custom_3': lambda: AlphaBetaPlayer(score_fn=game_agent.custom_score_3),
+    'AB_Reviewer_4': lambda: AlphaBetaPlayer(score_fn=game_agent.reviewer_custom_score_4),
+}
+default_agents = ('AB_Improved', 'AB_Custom', 'AB_Custom_2', 'AB_Custom_3', 'AB_Reviewer_4')
+
+
+def schedule(names, games, seed=2017):
+    """
+    The games of a round robin between `names`: `games` per pair (rounded up to
+    an even number), each opening seed played once from each seat.
+    Returns:
+        A list of game dicts with id, seed, player_1 and player_2.
+    """
+    rnd = random.Random(seed)
+    specs = []
+    for a, b in itertools.combinations(names, 2):
+        for _ in range((games + 1) // 2):
+            game_seed = rnd.getrandbits(32)
+            for first, second in ((a, b), (b, a)):
+                specs.append({'id': len(specs), 'seed': game_seed, 'player_1': first, 'player_2': second})
+    return specs
+
+
+def play_game(spec, time_limit=150, width=7, height=7):
+    """
+    Play one scheduled game with `time_limit` ms per move.
+    Returns:
+        The game dict with the winner's name, the reason the game ended and the number of moves.
+    """
+    random.seed(spec['seed'])
+    player_1, player_2 = agents[spec['player_1']](), agents[spec['player_2']]()
+    game = Board(player_1, player_2, width, height)
+    for _ in range(2):
+        game.apply_move(random.choice(game.get_legal_moves()))
+    start = time.time()
+    winner, history, reason = game.play(time_limit=time_limit)
+    result = dict(spec)
+    result['winner'] = spec['player_1'] if winner is player_1 else spec['player_2']
+    result['reason'] = reason
+    result['moves'] = len(history) + 2
+    result['seconds'] = round(time.time() - start, 3)
+    return result
+
+
+def _play(args):
+    return play_game(*args)
+
+
+def run(path, names=default_agents, games=20, time_limit=150, workers=None, seed=2017):
+    """
+    Play the tournament, appending results to `path`. Games already in the file are not replayed.
+    Returns:
+        All the results of the tournament.
+    """
+    specs = schedule(names, games, seed)
+    results = [r for r in read_results(path) if r['id'] < len(specs) and
+               _same_game(r, specs[r['id']])] if os.path.exists(path) else []
+    done = set(r['id'] for r in results)
+    pending = [spec for spec in specs if spec['id'] not in done]
+    start = time.time()
+    with open(path, 'a') as outfile, multiprocessing.Pool(workers) as pool:
+        tasks = ((spec, time_limit) for spec in pending)
+        for count, result in enumerate(pool.imap_unordered(_play, tasks), 1):
+            outfile.write(json.dumps(result) + '\n')
+            outfile.flush()
+            results.append(result)
+            sys.stderr.write('\r%d/%d games, %.0fs' % (len(done) + count, len(specs), time.time() - start))
+    sys.stderr.write('\n')
+    return results
+
+
+def _same_game(result, spec):
+    return all(result[k] == spec[k] for k in ('seed', 'player_1', 'player_2'))
+
+
+def read_results(path):
+    with open(path) as infile:
+        return [json.loads(line) for line in infile if line.strip()]
+
+
+def wilson_interval(wins, n, z=1.96):
+    """95% Wilson score interval of a win rate."""
+    if n == 0:
+        return 0.0, 1.0
+    p = wins / n
+    center = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return center - half, center + half
+
+
+def elo_ratings(results, names, iterations=500):
+    """
+    Elo ratings fitted to the game results with the Bradley-Terry model (minorization-maximization),
+    with one virtual draw per pair so that unbeaten or winless agents get finite ratings.
+    Returns:
+        A dict of name -> rating, the first of `names` at 0.
+    """
+    index = dict((name, i) for i, name in enumerate(names))
+    n = len(names)
+    wins = [[0.0] * n for _ in range(n)]
+    for r in results:
+        a, b = index[r['player_1']], index[r['player_2']]
+        winner, loser = (a, b) if r['winner'] == r['player_1'] else (b, a)
+        wins[winner][loser] += 1
+    for i, j in itertools.permutations(range(n), 2):
+        wins[i][j] += 0.5
+    strength = [1.0] * n
+    for _ in range(iterations):
+        updated = []
+        for i in range(n):
+            total = sum(wins[i])
+            games = sum((wins[i][j] + wins[j][i]) / (strength[i] + strength[j]) for j in range(n) if j != i)
+            updated.append(total / games if games else strength[i])
+        strength = updated
+    return dict((name, 400 * math.log10(strength[index[name]] / strength[0])) for name in names)
+
+
+def report(results, names=None):
+    """Print the win rate, confidence interval, Elo and losses by timeout of every agent."""
+    if names is None:
+        names = []
+        for r in results:
+            for name in (r['player_1'], r['player_2']):
+                if name not in names:
+                    names.append(name)
+    ratings = elo_ratings(results, names)
+    print('%d games' % len(results))
+    print('%-14s %6s %6s %8s %17s %7s %9s' % ('agent', 'games', 'wins', 'win %', '95% interval', 'Elo', 'timeouts'))
+    for name in names:
+        played = [r for r in results if name in (r['player_1'], r['player_2'])]
+        won = sum(1 for r in played if r['winner'] == name)
+        timeouts = sum(1 for r in played if r['winner'] != name and r['reason'] == 'timeout')
+        low, high = wilson_interval(won, len(played))
+        print('%-14s %6d %6d %7.1f%% %7.1f%% - %5.1f%% %+7.0f %9d' % (
+            name, len(played), won, 100.0 * won / len(played) if played else 0.0,
+            100 * low, 100 * high, ratings[name], timeouts))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play a parallel round robin between Isolation agents.')
+    parser.add_argument('agents', nargs='*', metavar='AGENT',
+                        help='agents to play: %s (default: %s)' % (', '.join(agents), ', '.join(default_agents)))
+    parser.add_argument('-g', '--games', type=int, default=20, help='games per pair of agents (default: 20)')
+    parser.add_argument('-t', '--time-limit', type=int, default=150, help='milliseconds per move (default: 150)')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='games played at once (default: one per CPU)')
+    parser.add_argument('--seed', type=int, default=2017, help='seed of the openings (default: 2017)')
+    parser.add_argument('-o', '--output', default='results.jsonl', help='results file (default: results.jsonl)')
+    parser.add_argument('--report', metavar='JSONL', help='only report the results of an earlier run')
+    args = parser.parse_args(argv)
+
+    if args.report:
+        report(read_results(args.report))
+        return 0
+    names = args.agents or default_agents
+    for name in names:
+        if name not in agents:
+            parser.error('unknown agent: %s' % name)
+    if len(names) < 2:
+        parser.error('at least two agents are needed')
+    results = run(args.output, names, args.games, args.time_limit, args.workers, args.seed)
+    report(results, list(names))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+Vectorized propagation for large batches of sudokus, using NumPy.
+
+Each batch is an (N, boxes) array of candidate masks. eliminate and only choice from
+solution.py run as array operations over all N boards at once, through peer and unit
+index arrays built once per Board. Most easy and medium puzzles are solved by that
+alone. Only the boards that stall are handed to the per-board search_masks().
+"""
+import numpy as np
+
+from solution import Board, search_masks, read_grids
+
+
+class BatchTables:
+    """
+    Index arrays of a Board for the vectorized strategies. Rows of uneven length (diagonal
+    boxes have more peers and units) are padded with an index one past the end, which points
+    at a column of zeros appended to the masks.
+    """
+    _tables = {}
+
+    def __new__(cls, board):
+        tables = cls._tables.get(board)
+        if tables is None:
+            tables = super().__new__(cls)
+            tables._build(board)
+            cls._tables[board] = tables
+        return tables
+
+    def _build(self, board):
+        n_boxes = len(board.boxes)
+        n_units = len(board.unit_index)
+        self.board = board
+        self.dtype = np.uint16 if board.size <= 16 else np.uint32
+        self.all_digits = self.dtype(board.all_digits_mask)
+        self.peers = _padded(board.peer_index, n_boxes)
+        self.units = np.array(board.unit_index, dtype=np.intp)
+        self.box_units = _padded(board.box_units_index, n_units)
+
+
+def _padded(rows, pad):
+    width = max(len(row) for row in rows)
+    return np.array([row + [pad] * (width - len(row)) for row in rows], dtype=np.intp)
+
+
+def _bit_count(masks):
+    counts = np.zeros(masks.shape, dtype=np.uint8)
+    masks = masks.copy()
+    while masks.any():
+        counts += (masks & 1).astype(np.uint8)
+        masks >>= 1
+    return counts
+
+# candidate counts of every 16 bit mask
+_mask_count16 = _bit_count(np.arange(1 << 16, dtype=np.uint32))
+
+def popcount(masks):
+    """Number of candidates of every mask of an integer array."""
+    if masks.dtype == np.uint16:
+        return _mask_count16[masks]
+    return _bit_count(masks)
+
+
+def grids_masks(grids, tables):
+    """
+    Convert grid strings into an (N, boxes) array of candidate masks.
+    """
+    board = tables.board
+    lookup = np.full(256, tables.all_digits, dtype=tables.dtype)
+    for d, bit in board.digit_masks.items():
+        lookup[ord(d)] = bit
+    chars = np.array([np.frombuffer(''.join(grid.split()).encode('ascii'), dtype=np.uint8) for grid in grids])
+    assert chars.shape[1] == len(board.boxes)
+    return lookup[chars]
+
+
+def eliminate_batch(masks, tables):
+    """
+    Vectorized eliminate(): remove the digit of every solved box from its peers, on every board.
+    Input: An (N, boxes) array of masks.
+    Output: The new array of masks.
+    """
+    singles = np.where(popcount(masks) == 1, masks, 0).astype(masks.dtype)
+    singles = np.concatenate([singles, np.zeros((len(masks), 1), dtype=masks.dtype)], axis=1)
+    taken = np.bitwise_or.reduce(singles[:, tables.peers], axis=2)
+    return masks & ~taken
+
+
+def only_choice_batch(masks, tables):
+    """
+    Vectorized only_choice(): a digit that fits in only one box of a unit is assigned to that box.
+    Input: An (N, boxes) array of masks.
+    Output: The new array of masks, and a boolean array of the boards that hit a contradiction
+            (a unit missing a digit, or a box that is the only place for two digits).
+    """
+    in_units = masks[:, tables.units]
+    seen_once = np.zeros(in_units.shape[:2], dtype=masks.dtype)
+    seen_more = np.zeros_like(seen_once)
+    for k in range(in_units.shape[2]):
+        seen_more |= seen_once & in_units[:, :, k]
+        seen_once |= in_units[:, :, k]
+    broken = (seen_once != tables.all_digits).any(axis=1)
+    unique = seen_once & ~seen_more
+    unique = np.concatenate([unique, np.zeros((len(masks), 1), dtype=masks.dtype)], axis=1)
+    only = np.bitwise_or.reduce(unique[:, tables.box_units], axis=2) & masks
+    broken |= (popcount(only) > 1).any(axis=1)
+    return np.where(only != 0, only, masks), broken
+
+
+def reduce_batch(masks, tables):
+    """
+    Vectorized reduce_puzzle(): repeat eliminate and only choice on all boards until none of
+    them changes. Boards drop out of the loop as soon as they are solved, broken or stalled.
+    Input: An (N, boxes) array of masks.
+    Output: The reduced masks and an array of states: 1 solved, 0 stalled, -1 no solution.
+    """
+    masks = masks.copy()
+    state = np.zeros(len(masks), dtype=np.int8)
+    active = np.arange(len(masks))
+    while len(active):
+        before = masks[active]
+        after = eliminate_batch(before, tables)
+        after, broken = only_choice_batch(after, tables)
+        broken |= (after == 0).any(axis=1)
+        masks[active] = after
+        counts = popcount(after)
+        solved = ~broken & (counts == 1).all(axis=1)
+        changed = (after != before).any(axis=1)
+        state[active[broken]] = -1
+        state[active[solved & ~changed]] = 1
+        active = active[~broken & changed]
+    return masks, state
+
+
+def solve_batch(grids, board=None, batch_size=4096):
+    """
+    Solve grids in batches of `batch_size`, propagating each batch with array operations and
+    searching only the boards that stall.
+    Args:
+        grids: an iterable of grid strings, all of the same size.
+        board: their Board, by default the diagonal board sized by the first well-formed grid.
+    Returns:
+        A generator of (index, values) tuples in input order, values being what solve() returns,
+        or None for a grid that does not fit the board.
+    """
+    grids = iter(grids)
+    index = 0
+    while True:
+        chunk = [grid for _, grid in zip(range(batch_size), grids)]
+        if not chunk:
+            return
+        if board is None:
+            board = _first_board(chunk)
+        fits = [board is not None and _fits(board, grid) for grid in chunk]
+        valid = [grid for grid, fit in zip(chunk, fits) if fit]
+        reduced = iter(())
+        if valid:
+            tables = BatchTables(board)
+            masks, state = reduce_batch(grids_masks(valid, tables), tables)
+            reduced = zip(masks.tolist(), state)
+        for fit in fits:
+            if not fit:
+                yield index, None
+                index += 1
+                continue
+            masks_row, board_state = next(reduced)
+            values = False
+            if board_state == 1:
+                values = board.mask_values(masks_row)
+            elif board_state == 0:
+                result = search_masks(board, masks_row)
+                if result is not False:
+                    values = board.mask_values(result)
+            yield index, values
+            index += 1
+
+
+def _fits(board, grid):
+    """Whether a grid has one digit of the board or '.' (or '0') per box, as grid_masks() expects."""
+    chars = ''.join(grid.split())
+    return len(chars) == len(board.boxes) and all(c in board.digit_masks or c in '.0' for c in chars)
+
+
+def _first_board(grids):
+    """The Board of the first grid with a supported number of boxes, None if there is none."""
+    for grid in grids:
+        try:
+            return Board.for_grid(grid)
+        except ValueError:
+            pass
+    return None
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    # python batch.py FILE: solve the grids of FILE and report the throughput
+    with open(sys.argv[1]) as infile:
+        grids = list(read_grids(infile))
+    start = time.perf_counter()
+    solved = sum(1 for _, values in solve_batch(grids) if values)
+    elapsed = time.perf_counter() - start
+    print('%d/%d solved in %.3fs (%.1f puzzles/s)' % (solved, len(grids), elapsed, len(grids) / elapsed))
@@ -0,0 +1,273 @@
+"""
+Benchmark harness for solution.py.
+
+Runs solve() over the bundled corpora in corpora/ and reports, per corpus, puzzles per
+second, p50/p99 latency, search nodes and peak memory. Results are saved as JSON so runs
+can be compared across commits:
+
+    python benchmark.py -o before.json
+    ... change the solver ...
+    python benchmark.py --compare before.json
+
+The corpora are diagonal sudokus, one grid per line: easy (36 clues, unique), hard (the
+minimal puzzles needing the most search), diagonal (minimal puzzles that are only unique
+with the diagonal rule) and unsolvable. `python benchmark.py --generate` rebuilds them
+from fixed seeds.
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import solution
+from solution import Board, DeadEndCache, SolverStats, count_solutions, read_grids, solve, values_grid
+
+corpora_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpora')
+corpus_names = ('easy', 'hard', 'diagonal', 'unsolvable')
+
+pipelines = {
+    'default': lambda: solution.default_pipeline,
+    'staged': lambda: solution.staged_pipeline,
+    'adaptive': lambda: solution.StrategyPipeline([solution.unit_strategies], adaptive=True),
+}
+
+
+def load_corpus(name):
+    """The grids of corpora/<name>.txt."""
+    with open(os.path.join(corpora_dir, name + '.txt')) as infile:
+        return list(read_grids(infile))
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(math.ceil(fraction * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+def run_corpus(grids, engine='bitmask', pipeline=None, repeat=3):
+    """
+    Benchmark solve() on a list of grids.
+    The timed passes run without instrumentation; a last pass collects SolverStats and
+    the peak memory traced by tracemalloc.
+    Returns:
+        A dict of puzzles, solved, seconds (fastest pass), puzzles_per_second, p50_ms, p99_ms,
+        nodes, backtracks, max_depth and peak_kib. The search counters are None for the
+        'strings' engine, which collects no SolverStats.
+    """
+    options = {'engine': engine}
+    if engine == 'bitmask':
+        options['pipeline'] = pipeline
+    best = None
+    latencies = None
+    for _ in range(repeat):
+        pass_latencies = []
+        solved = 0
+        for grid in grids:
+            start = time.perf_counter()
+            if solve(grid, **options):
+                solved += 1
+            pass_latencies.append(time.perf_counter() - start)
+        total = sum(pass_latencies)
+        if best is None or total < best:
+            best, latencies = total, pass_latencies
+
+    stats = SolverStats() if engine != 'strings' else None
+    tracemalloc.start()
+    try:
+        for grid in grids:
+            solve(grid, stats=stats, **options)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    search = stats.as_dict()['search'] if stats is not None else {}
+    return {
+        'puzzles': len(grids),
+        'solved': solved,
+        'seconds': best,
+        'puzzles_per_second': len(grids) / best if best else float('inf'),
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'nodes': search.get('nodes'),
+        'backtracks': search.get('backtracks'),
+        'max_depth': search.get('max_depth'),
+        'peak_kib': peak / 1024.0,
+    }
+
+
+def git_commit():
+    """The commit of the working tree, None outside a git checkout."""
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                         cwd=os.path.dirname(os.path.abspath(__file__)),
+                                         stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode().strip()
+
+
+def run(names=corpus_names, engine='bitmask', pipeline='default', repeat=3):
+    """
+    Benchmark every corpus in `names`.
+    Returns:
+        A dict with the run settings and a `corpora` dict of corpus name -> run_corpus() results.
+    """
+    results = {
+        'commit': git_commit(),
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'engine': engine,
+        'pipeline': pipeline,
+        'repeat': repeat,
+        'corpora': {},
+    }
+    for name in names:
+        results['corpora'][name] = run_corpus(load_corpus(name), engine, pipelines[pipeline](), repeat)
+    return results
+
+
+def report(results, baseline=None):
+    """
+    Print results as a table; with a baseline, also the change in puzzles/s and p99 latency.
+    """
+    print('commit %s, engine %s, pipeline %s' % (results['commit'], results['engine'], results['pipeline']))
+    header = '%-11s %7s %10s %9s %9s %9s %10s' % ('corpus', 'solved', 'puzzles/s', 'p50 ms', 'p99 ms', 'nodes', 'peak KiB')
+    if baseline:
+        header += '  vs %s' % (baseline.get('commit'),)
+    print(header)
+    for name, r in results['corpora'].items():
+        line = '%-11s %3d/%-3d %10.1f %9.3f %9.3f %9s %10.1f' % (
+            name, r['solved'], r['puzzles'], r['puzzles_per_second'], r['p50_ms'], r['p99_ms'],
+            '-' if r['nodes'] is None else r['nodes'], r['peak_kib'])
+        old = (baseline or {}).get('corpora', {}).get(name)
+        if old:
+            line += '  %+6.1f%% puzzles/s, %+6.1f%% p99' % (
+                100.0 * (r['puzzles_per_second'] / old['puzzles_per_second'] - 1),
+                100.0 * (r['p99_ms'] / old['p99_ms'] - 1) if old['p99_ms'] else 0.0)
+        print(line)
+
+
+# Corpus generation
+# -----------------
+
+def random_solution(rnd, board):
+    """A random solved grid: a few random givens, solved, retried until they have a solution."""
+    while True:
+        grid = ['.'] * len(board.boxes)
+        for i in rnd.sample(range(len(grid)), board.size + 2):
+            grid[i] = rnd.choice(board.digits)
+        values = solve(''.join(grid), board=board)
+        if values:
+            return values_grid(values)
+
+
+def reduce_clues(rnd, grid, board, keep=0):
+    """
+    Remove the clues of a grid in random order as long as it stays unique, stopping at `keep` clues.
+    The uniqueness checks share a DeadEndCache, as each grid is the previous one minus a clue.
+    """
+    dead_ends = DeadEndCache()
+    grid = list(grid)
+    clues = [i for i, c in enumerate(grid) if c != '.']
+    rnd.shuffle(clues)
+    left = len(clues)
+    for i in clues:
+        if left <= keep:
+            break
+        digit, grid[i] = grid[i], '.'
+        if count_solutions(''.join(grid), board=board, dead_ends=dead_ends) == 1:
+            left -= 1
+        else:
+            grid[i] = digit
+    return ''.join(grid)
+
+
+def make_unsolvable(rnd, grid, board):
+    """
+    Put a digit into an empty box of a unique grid so that it has no solution, without
+    repeating a digit in any unit (so the contradiction takes propagation or search to find).
+    """
+    empty = [i for i, c in enumerate(grid) if c == '.']
+    while True:
+        i = rnd.choice(empty)
+        taken = set(grid[p] for p in board.peer_index[i])
+        digit = rnd.choice([d for d in board.digits if d not in taken] or board.digits)
+        candidate = grid[:i] + digit + grid[i + 1:]
+        if digit not in taken and count_solutions(candidate, board=board) == 0:
+            return candidate
+
+
+def generate(seed=2017, easy=400, hard=100, diagonal=100, unsolvable=100, pool=400):
+    """
+    Build the corpora from `seed` and write them to corpora/.
+    Hard puzzles are the `hard` minimal puzzles out of `pool` that needed the most search nodes.
+    """
+    rnd = random.Random(seed)
+    board = solution.diagonal_board
+    regular = Board(9, diagonal=False)
+    corpora = {}
+    corpora['easy'] = [reduce_clues(rnd, random_solution(rnd, board), board, keep=36) for _ in range(easy)]
+    minimal = []
+    for _ in range(pool):
+        grid = reduce_clues(rnd, random_solution(rnd, board), board)
+        stats = SolverStats()
+        solve(grid, stats=stats)
+        minimal.append((stats.nodes, grid))
+    minimal.sort(key=lambda item: -item[0])
+    corpora['hard'] = [grid for _, grid in minimal[:hard]]
+    corpora['diagonal'] = [grid for _, grid in minimal[hard:]
+                           if count_solutions(grid, board=regular) > 1][:diagonal]
+    corpora['unsolvable'] = [make_unsolvable(rnd, grid, board) for _, grid in minimal[-unsolvable:]]
+
+    if not os.path.isdir(corpora_dir):
+        os.makedirs(corpora_dir)
+    for name, grids in corpora.items():
+        with open(os.path.join(corpora_dir, name + '.txt'), 'w') as outfile:
+            outfile.write('# %s: %d diagonal sudokus, generated by benchmark.py --generate (seed %d)\n'
+                          % (name, len(grids), seed))
+            outfile.write('\n'.join(grids) + '\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark solution.solve() on the bundled corpora.')
+    parser.add_argument('corpora', nargs='*', metavar='CORPUS',
+                        help='corpora to run: %s (default: all)' % ', '.join(corpus_names))
+    parser.add_argument('--engine', choices=('bitmask', 'dlx', 'strings'), default='bitmask')
+    parser.add_argument('--pipeline', choices=sorted(pipelines), default='default',
+                        help='StrategyPipeline of the bitmask engine (default: default)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed passes per corpus, the fastest is kept')
+    parser.add_argument('-o', '--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', metavar='JSON', help='show the change against an earlier results file')
+    parser.add_argument('--generate', action='store_true', help='rebuild the corpora and exit')
+    args = parser.parse_args(argv)
+
+    if args.generate:
+        generate()
+        return 0
+    for name in args.corpora:
+        if name not in corpus_names:
+            parser.error('unknown corpus: %s' % name)
+    results = run(args.corpora or corpus_names, args.engine, args.pipeline, args.repeat)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as infile:
+            baseline = json.load(infile)
+    report(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(results, outfile, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
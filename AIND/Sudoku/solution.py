@@ -1,11 +1,20 @@
+import argparse
+import array
 import collections
+import contextvars
+import gzip
+import itertools
+import json
 import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
 
 rows = 'ABCDEFGHI'
 cols = '123456789'
 
-assignments = []
-
 def cross(a, b):
     return [s+t for s in a for t in b]
 
@@ -39,19 +48,21 @@ def display(values):
 def grid_values(grid):
     """
     Convert grid into a dict of {square: char} with '123456789' for empties.
-    Input: A grid in string form.
+    Input: A grid in string form, '.' (or '0') for empty boxes.
     Output: A grid in dictionary form
             Keys: The boxes, e.g., 'A1'
             Values: The value in each box, e.g., '8'. If the box has no value, then the value will be '123456789'.
+    Raises ValueError if the grid does not have 81 boxes.
     """
     chars = []
     digits = '123456789'
     for c in grid:
         if c in digits:
             chars.append(c)
-        if c == '.':
+        if c in '.0':
             chars.append(digits)
-    assert len(chars) == 81
+    if len(chars) != 81:
+        raise ValueError('grid has %d boxes, expected 81' % len(chars))
     return dict(zip(boxes, chars))
     
 def has_duplicates(values, unit):
@@ -126,10 +137,38 @@ def check_diagonal(values, box, value):
                 return False
     return True
 
+class AssignmentRecorder:
+    """
+    Records a full copy of the board on every single digit assignment. This is the list of
+    boards visualize_assignments() replays, so it grows with every assignment of the solve.
+    """
+    def __init__(self):
+        self.assignments = []
+
+    def record(self, values, box, value):
+        self.assignments.append(values.copy())
+
+
+class DeltaRecorder:
+    """
+    Records only (box, value) pairs, keeping the last `maxlen` of them in a ring buffer
+    so memory stays bounded however long the solve runs.
+    """
+    def __init__(self, maxlen=1000):
+        self.assignments = collections.deque(maxlen=maxlen)
+
+    def record(self, values, box, value):
+        self.assignments.append((box, value))
+
+
+# recorder of the solve() call in progress in the current thread or task; None (the default)
+# records nothing
+_recorder = contextvars.ContextVar('recorder', default=None)
+
 def assign_value(values, box, value):
     """
     Please use this function to update your values dictionary!
-    Assigns a value to a given box. If it updates the board record it.
+    Assigns a value to a given box. If it updates the board and a recorder was passed to solve(), record it.
     """
 
     # Don't waste memory appending actions that don't actually change any values
@@ -137,8 +176,9 @@ def assign_value(values, box, value):
         return values
 
     values[box] = value
-    if len(value) == 1:
-        assignments.append(values.copy())
+    recorder = _recorder.get()
+    if recorder is not None and len(value) == 1:
+        recorder.record(values, box, value)
     return values
 
 
@@ -314,35 +354,944 @@ def search(values):
             if result:
                 return result
 
+# Bitmask engine
+# --------------
+# The sudoku held as a flat list of ints, one per box in the order of `Board.boxes`.
+# Bit k of a mask is set while the k-th digit of the board is still a candidate, so
+# eliminating a digit is a single `&` and copying a board during search is a plain
+# list slice instead of a dict copy. The tables the engine walks live on a Board,
+# which works for any n x n sudoku with square boxes (4x4, 9x9, 16x16, 25x25).
+
+board_digits = '123456789ABCDEFGHIJKLMNOP'
+board_rows = 'ABCDEFGHIJKLMNOPQRSTUVWXY'
+
+
+class _MaskTable:
+    """
+    Stands in for a list indexed by mask on boards whose masks are too wide to tabulate.
+    """
+    def __init__(self, function):
+        self.function = function
+
+    def __getitem__(self, mask):
+        return self.function(mask)
+
+
+class Board:
+    """
+    Boxes, units, peers and candidate masks of an n x n diagonal sudoku, n being a square
+    from 4 to 25. Boards are cached per (size, diagonal), so Board(16) builds its tables
+    once and later calls return the same object.
+    """
+    _boards = {}
+
+    def __new__(cls, size=9, diagonal=True):
+        board = cls._boards.get((size, diagonal))
+        if board is None:
+            board = super().__new__(cls)
+            board._build(size, diagonal)
+            cls._boards[(size, diagonal)] = board
+        return board
+
+    @classmethod
+    def for_grid(cls, grid, diagonal=True):
+        """
+        The board of a grid string, sized by the number of boxes in it (81 -> 9x9, 256 -> 16x16, ...).
+        """
+        size = int(round(sum(1 for c in grid if not c.isspace()) ** 0.5))
+        return cls(size, diagonal)
+
+    def _build(self, size, diagonal):
+        box_size = int(round(size ** 0.5))
+        if box_size < 2 or box_size * box_size != size or size > len(board_digits):
+            raise ValueError('unsupported board size: %r' % (size,))
+        self.size = size
+        self.diagonal = diagonal
+        self.digits = board_digits[:size]
+        self.rows = board_rows[:size]
+        self.cols = [str(c) for c in range(1, size + 1)]
+        self.boxes = [r + c for r in self.rows for c in self.cols]
+
+        bands = [self.rows[k:k + box_size] for k in range(0, size, box_size)]
+        stacks = [self.cols[k:k + box_size] for k in range(0, size, box_size)]
+        self.unitlist = ([cross(r, self.cols) for r in self.rows] +
+                         [cross(self.rows, [c]) for c in self.cols] +
+                         [cross(rs, cs) for rs in bands for cs in stacks])
+        if diagonal:
+            self.unitlist += [[r + c for r, c in zip(self.rows, self.cols)],
+                              [r + c for r, c in zip(self.rows, self.cols[::-1])]]
+
+        self.box_index = dict((s, i) for i, s in enumerate(self.boxes))
+        self.unit_index = [[self.box_index[s] for s in u] for u in self.unitlist]
+        self.box_units_index = [[] for _ in self.boxes]
+        for k, u in enumerate(self.unit_index):
+            for i in u:
+                self.box_units_index[i].append(k)
+        self.peer_index = [sorted(set(i for k in ks for i in self.unit_index[k]) - set([b]))
+                           for b, ks in enumerate(self.box_units_index)]
+        # for every unit, the units crossing it in two or more boxes, as
+        # (boxes in both units, rest of this unit, rest of the other unit)
+        self.unit_crossings = [[([i for i in u if i in v], [i for i in u if i not in v], [i for i in v if i not in u])
+                                for v in self.unit_index if v is not u and len(set(u) & set(v)) > 1]
+                               for u in self.unit_index]
+
+        self.all_digits_mask = (1 << size) - 1
+        self.digit_masks = dict((d, 1 << k) for k, d in enumerate(self.digits))
+        # number of candidates and the candidate string for every possible mask
+        digit_masks = list(self.digit_masks.items())
+        count = lambda m: bin(m).count('1')
+        candidates = lambda m: ''.join(d for d, bit in digit_masks if m & bit)
+        if size <= 16:
+            self.mask_count = [count(m) for m in range(self.all_digits_mask + 1)]
+            self.mask_digits = [candidates(m) for m in range(self.all_digits_mask + 1)]
+        else:
+            self.mask_count = _MaskTable(count)
+            self.mask_digits = _MaskTable(candidates)
+        self._fingerprint_code = 'H' if size <= 16 else 'I'
+        self._exact_cover_rows = None
+
+    def grid_masks(self, grid):
+        """
+        Convert grid into a list of candidate masks, in the order of `boxes`.
+        Input: A grid in string form, '.' (or '0') for empty boxes.
+        Output: A list of ints; empty boxes get every digit as a candidate.
+        Raises ValueError if the grid does not have one box per box of the board.
+        """
+        masks = []
+        for c in grid:
+            if c in self.digit_masks:
+                masks.append(self.digit_masks[c])
+            elif c in '.0':
+                masks.append(self.all_digits_mask)
+        if len(masks) != len(self.boxes):
+            raise ValueError('grid has %d boxes, expected %d' % (len(masks), len(self.boxes)))
+        return masks
+
+    def mask_values(self, masks):
+        """
+        Convert a list of candidate masks back into the dictionary form used by the rest of this module.
+        Input: A sudoku as a list of masks.
+        Output: A sudoku in dictionary form.
+        """
+        mask_digits = self.mask_digits
+        return dict((s, mask_digits[m]) for s, m in zip(self.boxes, masks))
+
+    def fingerprint(self, masks):
+        """
+        A compact, exact key for a list of masks: the masks packed as 2 (or, past 16x16, 4) byte ints.
+        """
+        return array.array(self._fingerprint_code, masks).tobytes()
+
+    @property
+    def exact_cover_rows(self):
+        """
+        The exact cover rows of the board, built on first use: every (box index, digit) candidate
+        covers the box and its digit in each unit the box belongs to.
+        """
+        if self._exact_cover_rows is None:
+            self._exact_cover_rows = dict(((i, d), [('box', i)] + [('unit', u, d) for u in units])
+                                          for i, units in enumerate(self.box_units_index)
+                                          for d in self.digits)
+        return self._exact_cover_rows
+
+
+# the 9x9 diagonal board of the tables above
+diagonal_board = Board(9)
+
+
+def naked_subsets_unit(board, masks, u, size):
+    """
+    Bitmask version of naked_pairs(): `size` boxes of a unit with the same `size` candidates
+    remove those candidates from the rest of the unit.
+    Input: The Board, a sudoku as a list of masks, the position of the unit in unitlist, the subset size.
+    Output: The indices of the boxes that changed, or False if more than `size` boxes share the subset.
+    """
+    unit = board.unit_index[u]
+    mask_count = board.mask_count
+    subsets = [masks[i] for i in unit if mask_count[masks[i]] == size]
+    changed = []
+    if len(subsets) < size:
+        return changed
+    for m in set(subsets):
+        n = subsets.count(m)
+        if n > size:
+            return False
+        if n == size:
+            for i in unit:
+                if masks[i] != m and masks[i] & m:
+                    masks[i] &= ~m
+                    if masks[i] == 0:
+                        return False
+                    changed.append(i)
+    return changed
+
+def naked_quads_unit(board, masks, u):
+    return naked_subsets_unit(board, masks, u, 4)
+
+def naked_triples_unit(board, masks, u):
+    return naked_subsets_unit(board, masks, u, 3)
+
+def naked_twins_unit(board, masks, u):
+    return naked_subsets_unit(board, masks, u, 2)
+
+
+def box_line_unit(board, masks, u):
+    """
+    Bitmask version of box_line_reduction(): a digit whose places in this unit all lie where it
+    crosses another unit is removed from the rest of that other unit.
+    Input: The Board, a sudoku as a list of masks, the position of the unit in unitlist.
+    Output: The indices of the boxes that changed, or False if a box ran out of candidates.
+    """
+    changed = []
+    for shared, unit_rest, other_rest in board.unit_crossings[u]:
+        inside = 0
+        for i in shared:
+            inside |= masks[i]
+        outside = 0
+        for i in unit_rest:
+            outside |= masks[i]
+        confined = inside & ~outside
+        if confined:
+            for i in other_rest:
+                if masks[i] & confined:
+                    masks[i] &= ~confined
+                    if masks[i] == 0:
+                        return False
+                    changed.append(i)
+    return changed
+
+
+def only_choice_unit(board, masks, u):
+    """
+    Bitmask version of only_choice(): a digit that fits in only one box of the unit is assigned to that box.
+    Input: The Board, a sudoku as a list of masks, the position of the unit in unitlist.
+    Output: The indices of the boxes that changed, or False if the unit can no longer hold every digit.
+    """
+    unit = board.unit_index[u]
+    seen_once = 0
+    seen_more = 0
+    for i in unit:
+        seen_more |= seen_once & masks[i]
+        seen_once |= masks[i]
+    if seen_once != board.all_digits_mask:
+        return False
+    unique = seen_once & ~seen_more
+    changed = []
+    if unique:
+        mask_count = board.mask_count
+        for i in unit:
+            m = masks[i] & unique
+            if m and masks[i] != m:
+                # a box that is the only place for two digits cannot hold both
+                if mask_count[m] > 1:
+                    return False
+                masks[i] = m
+                changed.append(i)
+    return changed
+
+
+# strategies run on a unit whenever one of its boxes changes, in the order reduce_puzzle() uses
+unit_strategies = [naked_quads_unit, naked_triples_unit, naked_twins_unit, box_line_unit, only_choice_unit]
+
+
+class StrategyPipeline:
+    """
+    Which unit strategies reduce_masks() runs, in what order and how often.
+    Args:
+        tiers: a list of lists of unit strategies. A unit queued by a change runs through the
+            strategies of the first tier; later tiers only take units once every earlier tier has
+            stalled, so e.g. naked quads in a last tier only run when the cheap strategies have
+            nothing left to do.
+        limits: optional dict of strategy name -> most calls per reduce_masks() call. Past its
+            limit a strategy is skipped until the next reduction (after the next search guess).
+        adaptive(bool): measure the yield (boxes changed per second) of every strategy while
+            solving and, every `adapt_every` calls, reorder the strategies of each tier by it.
+    """
+    def __init__(self, tiers, limits=None, adaptive=False, adapt_every=5000):
+        self.tiers = [list(tier) for tier in tiers]
+        self.limits = dict(limits) if limits else None
+        self.adaptive = adaptive
+        self.adapt_every = adapt_every
+        self.changed = collections.Counter()
+        self.seconds = collections.Counter()
+        self._calls = 0
+
+    def observe(self, strategy, seconds, changed):
+        """Account one timed call of `strategy` in adaptive mode."""
+        self.changed[strategy.__name__] += changed
+        self.seconds[strategy.__name__] += seconds
+        self._calls += 1
+        if self._calls % self.adapt_every == 0:
+            for tier in self.tiers:
+                tier.sort(key=self.strategy_yield, reverse=True)
+
+    def strategy_yield(self, strategy):
+        """Boxes changed per second by `strategy` so far."""
+        name = strategy.__name__
+        return self.changed[name] / self.seconds[name] if self.seconds[name] else 0.0
+
+
+# all strategies on every queued unit, as reduce_puzzle() runs them
+default_pipeline = StrategyPipeline([unit_strategies])
+# cheap strategies first; subsets of three and four only once everything else has stalled
+staged_pipeline = StrategyPipeline([[only_choice_unit, naked_twins_unit], [box_line_unit],
+                                    [naked_triples_unit, naked_quads_unit]])
+
+
+class SolverStats:
+    """
+    Optional counters for solve(). Per strategy: calls, wall time, candidates removed and boxes
+    solved; for the search: nodes, backtracks and the deepest level reached. Pass the same object
+    to many solve() calls to aggregate over a workload, then report it with as_dict() or to_json().
+    """
+    def __init__(self):
+        self.strategies = {}
+        self.nodes = 0
+        self.backtracks = 0
+        self.max_depth = 0
+
+    def record(self, name, board, before, masks, start, changed=None):
+        """
+        Account one call of strategy `name` that started at perf_counter() `start` on the board
+        `before` and left it as `masks`. Only the boxes in `changed` are compared, if given.
+        """
+        seconds = time.perf_counter() - start
+        record = self.strategies.get(name)
+        if record is None:
+            record = self.strategies[name] = {'calls': 0, 'seconds': 0.0, 'removed': 0, 'solved': 0}
+        record['calls'] += 1
+        record['seconds'] += seconds
+        mask_count = board.mask_count
+        for i in (range(len(masks)) if changed is None else set(changed)):
+            if before[i] != masks[i]:
+                record['removed'] += mask_count[before[i]] - mask_count[masks[i]]
+                if mask_count[masks[i]] == 1:
+                    record['solved'] += 1
+
+    def search_node(self, depth):
+        self.nodes += 1
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def as_dict(self):
+        return {'strategies': dict((name, dict(record)) for name, record in self.strategies.items()),
+                'search': {'nodes': self.nodes, 'backtracks': self.backtracks, 'max_depth': self.max_depth}}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.as_dict(), **kwargs)
+
+
+def _eliminate_pending(board, masks, pending, queued, unit_queues):
+    """
+    Drain the pending boxes of reduce_masks(): a solved box eliminates its digit from its peers,
+    which become pending in turn, and the units of every drained box are queued in every tier.
+    Returns False if a box ran out of candidates.
+    """
+    mask_count = board.mask_count
+    peer_index = board.peer_index
+    box_units_index = board.box_units_index
+    tiers = list(zip(queued, unit_queues))
+    while pending:
+        i = pending.pop()
+        m = masks[i]
+        if mask_count[m] == 1:
+            for p in peer_index[i]:
+                if masks[p] & m:
+                    masks[p] &= ~m
+                    if masks[p] == 0:
+                        return False
+                    pending.append(p)
+        for tier_queued, unit_queue in tiers:
+            for u in box_units_index[i]:
+                if not tier_queued[u]:
+                    tier_queued[u] = True
+                    unit_queue.append(u)
+    return True
+
 
-def solve(grid):
+def reduce_masks(board, masks, changed=None, stats=None, pipeline=None):
+    """
+    Event driven version of reduce_puzzle(). Instead of sweeping the whole board until nothing
+    changes, boxes whose candidates changed are queued: a solved box eliminates its digit from its
+    peers, and every unit touching a changed box is queued for the strategies of the pipeline.
+    The work done follows the number of changes rather than the size of the board.
+    Input: The Board, a sudoku as a list of masks, the indices of the boxes that changed since
+           the board was last reduced (None for all of them), an optional SolverStats and the
+           StrategyPipeline to run (default_pipeline if None).
+    Output: The reduced list, or False if the puzzle hit a contradiction.
+    """
+    if pipeline is None:
+        pipeline = default_pipeline
+    tiers = pipeline.tiers
+    budget = dict(pipeline.limits) if pipeline.limits else None
+    adaptive = pipeline.adaptive
+    pending = list(range(len(masks)) if changed is None else changed)
+    queued = [[False] * len(board.unit_index) for _ in tiers]
+    unit_queues = [collections.deque() for _ in tiers]
+    while True:
+        if stats is None:
+            if not _eliminate_pending(board, masks, pending, queued, unit_queues):
+                return False
+        else:
+            before, start = masks[:], time.perf_counter()
+            consistent = _eliminate_pending(board, masks, pending, queued, unit_queues)
+            stats.record('eliminate', board, before, masks, start)
+            if not consistent:
+                return False
+        # take a unit from the first tier that has one
+        for t, unit_queue in enumerate(unit_queues):
+            if unit_queue:
+                break
+        else:
+            return masks
+        u = unit_queue.popleft()
+        queued[t][u] = False
+        # observe() may reorder the tier while it runs, so adaptive pipelines loop over a copy
+        for strategy in (list(tiers[t]) if adaptive else tiers[t]):
+            if budget is not None and strategy.__name__ in budget:
+                if budget[strategy.__name__] <= 0:
+                    continue
+                budget[strategy.__name__] -= 1
+            if stats is None and not adaptive:
+                changed = strategy(board, masks, u)
+            else:
+                before = masks[:] if stats is not None else None
+                start = time.perf_counter()
+                changed = strategy(board, masks, u)
+                if stats is not None:
+                    stats.record(strategy.__name__, board, before, masks, start, changed or None)
+                if adaptive and changed is not False:
+                    pipeline.observe(strategy, time.perf_counter() - start, len(changed))
+            if changed is False:
+                return False
+            pending.extend(changed)
+
+
+class DeadEndCache:
+    """
+    Bounded LRU of reduced boards that search_masks() or iter_search_masks() have proven to have
+    no solution, keyed by key(). Within one search sibling branches fix different digits in the
+    branching box, so the cache pays off when it is shared between searches of related grids,
+    e.g. the near-identical grids count_solutions() checks while benchmark.py removes clues.
+    """
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._dead_ends = collections.OrderedDict()
+
+    def __contains__(self, key):
+        if key in self._dead_ends:
+            self._dead_ends.move_to_end(key)
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def __len__(self):
+        return len(self._dead_ends)
+
+    @staticmethod
+    def key(board, masks):
+        """The key of a reduced board; boards of another size or rule never share it."""
+        return board.size, board.diagonal, board.fingerprint(masks)
+
+    def add(self, key):
+        self._dead_ends[key] = True
+        if len(self._dead_ends) > self.maxsize:
+            self._dead_ends.popitem(last=False)
+
+    def info(self):
+        """Hit and miss counters and the size of the cache, as a dict."""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self), 'maxsize': self.maxsize}
+
+
+def search_masks(board, masks, changed=None, dead_ends=None, stats=None, depth=0, pipeline=None):
+    """
+    Bitmask version of search(): depth-first search over the box with the fewest candidates.
+    The diagonal units are part of `peer_index`, so no separate diagonal checks are needed.
+    Input: The Board, a sudoku as a list of masks, the indices of the boxes changed since the
+           last reduction, an optional DeadEndCache consulted before branching, an optional
+           SolverStats, the depth of this node and the StrategyPipeline used to reduce.
+    Output: The solved list of masks, or False if there is no solution.
+    """
+    if stats is not None:
+        stats.search_node(depth)
+    masks = reduce_masks(board, masks, changed, stats, pipeline)
+    if masks is False:
+        return False
+    mask_count = board.mask_count
+    unsolved = [(mask_count[m], i) for i, m in enumerate(masks) if mask_count[m] > 1]
+    if not unsolved:
+        return masks
+    if dead_ends is not None:
+        key = dead_ends.key(board, masks)
+        if key in dead_ends:
+            return False
+    # Choose one of the unfilled boxes with the fewest possibilities and try each digit, lowest bit first
+    n, i = min(unsolved)
+    m = masks[i]
+    while m:
+        digit = m & -m
+        m ^= digit
+        new_masks = masks[:]
+        new_masks[i] = digit
+        # only the branching box changed, so only its peers and units need propagating
+        result = search_masks(board, new_masks, [i], dead_ends, stats, depth + 1, pipeline)
+        if result:
+            return result
+        if stats is not None:
+            stats.backtracks += 1
+    if dead_ends is not None:
+        dead_ends.add(key)
+    return False
+
+
+def iter_search_masks(board, masks, changed=None, pipeline=None, dead_ends=None):
+    """
+    Like search_masks(), but a generator of every solution in turn instead of the first one,
+    so a caller can stop after as many as it needs.
+    Input: The Board, a sudoku as a list of masks, the indices of the boxes changed since the
+           last reduction, the StrategyPipeline used to reduce and an optional DeadEndCache.
+           Only branches searched to the end without a solution are added to the cache.
+    Output: Yields solved lists of masks.
+    """
+    masks = reduce_masks(board, masks, changed, None, pipeline)
+    if masks is False:
+        return
+    mask_count = board.mask_count
+    unsolved = [(mask_count[m], i) for i, m in enumerate(masks) if mask_count[m] > 1]
+    if not unsolved:
+        yield masks
+        return
+    if dead_ends is not None:
+        key = dead_ends.key(board, masks)
+        if key in dead_ends:
+            return
+    found = False
+    n, i = min(unsolved)
+    m = masks[i]
+    while m:
+        digit = m & -m
+        m ^= digit
+        new_masks = masks[:]
+        new_masks[i] = digit
+        for result in iter_search_masks(board, new_masks, [i], pipeline, dead_ends):
+            found = True
+            yield result
+    if dead_ends is not None and not found:
+        dead_ends.add(key)
+
+
+def count_solutions(grid, limit=2, board=None, pipeline=None, dead_ends=None):
+    """
+    Count the solutions of a grid, stopping the search once `limit` have been found.
+    With the default limit of 2 this tells whether the grid has no (0), a unique (1) or
+    more than one (2) solution.
+    Input: A grid in string form, the most solutions to look for, its Board (sized by the
+           grid by default), the StrategyPipeline used to reduce and an optional DeadEndCache
+           shared between calls.
+    Output: The number of solutions found, at most `limit`.
+    """
+    if board is None:
+        board = Board.for_grid(grid)
+    solutions = iter_search_masks(board, board.grid_masks(grid), pipeline=pipeline, dead_ends=dead_ends)
+    return sum(1 for _ in itertools.islice(solutions, limit))
+
+
+# Exact cover engine
+# ------------------
+# The puzzle as an exact cover problem for Algorithm X: every (box, digit) candidate is a row
+# that covers the box itself and its digit in each of the units the box belongs to (row,
+# column, square and, on the diagonals, diagonal). A solution picks one row per box covering
+# every column exactly once. The columns are kept as a dict of sets, so covering and uncovering
+# a column are the set removals and re-insertions dancing links does on linked lists.
+
+def _cover(rows, columns, row):
+    """
+    Select `row`: remove its columns and every other row that collides with it.
+    Returns the removed columns so that _uncover() can put them back.
+    """
+    removed = []
+    for c in rows[row]:
+        for other in columns[c]:
+            for k in rows[other]:
+                if k != c:
+                    columns[k].remove(other)
+        removed.append(columns.pop(c))
+    return removed
+
+def _uncover(rows, columns, row, removed):
+    """Undo _cover(), in reverse order."""
+    for c in reversed(rows[row]):
+        columns[c] = removed.pop()
+        for other in columns[c]:
+            for k in rows[other]:
+                if k != c:
+                    columns[k].add(other)
+
+
+def search_exact_cover(rows, columns, solution, stats=None, depth=0):
+    """
+    Algorithm X: cover the column with the fewest rows left and try each of its rows.
+    Input: The rows as a dict of row -> columns, the open columns as a dict of column -> set of
+           rows, the rows picked so far, an optional SolverStats and the depth of this node.
+    Output: True once every column is covered (the rows are in solution), False if there is no cover.
+    """
+    if stats is not None:
+        stats.search_node(depth)
+    if not columns:
+        return True
+    c = min(columns, key=lambda c: len(columns[c]))
+    for row in list(columns[c]):
+        solution.append(row)
+        removed = _cover(rows, columns, row)
+        if search_exact_cover(rows, columns, solution, stats, depth + 1):
+            return True
+        _uncover(rows, columns, row, removed)
+        solution.pop()
+        if stats is not None:
+            stats.backtracks += 1
+    return False
+
+
+def solve_exact_cover(grid, board=diagonal_board, stats=None):
+    """
+    Solve a grid with Algorithm X.
+    Input: A grid in string form, its Board and an optional SolverStats for the search counters.
+    Output: A sudoku in dictionary form, False if no solution exists.
+    """
+    rows = board.exact_cover_rows
+    columns = collections.defaultdict(set)
+    for row, cs in rows.items():
+        for c in cs:
+            columns[c].add(row)
+    columns = dict(columns)
+    solution = []
+    for i, m in enumerate(board.grid_masks(grid)):
+        if m != board.all_digits_mask:
+            row = (i, board.mask_digits[m])
+            # a given that collides with an earlier one has lost a column already
+            if any(c not in columns or row not in columns[c] for c in rows[row]):
+                return False
+            solution.append(row)
+            _cover(rows, columns, row)
+    if not search_exact_cover(rows, columns, solution, stats):
+        return False
+    values = dict((s, board.digits) for s in board.boxes)
+    for i, d in solution:
+        values[board.boxes[i]] = d
+    return values
+
+
+def solve(grid, engine='bitmask', recorder=None, board=None, dead_ends=None, stats=None, pipeline=None):
     """
     Find the solution to a Sudoku grid.
     Args:
         grid(string): a string representing a sudoku grid.
             Example: '2.............62....1....7...6..8...3...9...7...6..4...4....8....52.............3'
+        engine(string): 'bitmask' (default) solves on the flat list of candidate masks,
+            'dlx' solves the puzzle as an exact cover problem with Algorithm X,
+            'strings' runs the original dict of candidate strings (9x9 diagonal sudoku only).
+        recorder: optional AssignmentRecorder or DeltaRecorder that assign_value() reports to for
+            the duration of this call. Only the 'strings' engine goes through assign_value().
+        board: the Board of the grid; by default the diagonal board sized by the grid
+            (81 boxes -> 9x9, 256 -> 16x16, 625 -> 25x25).
+        dead_ends: optional DeadEndCache of the 'bitmask' engine, shared between calls to skip
+            reduced boards already proven to have no solution.
+        stats: optional SolverStats, filled in by the 'bitmask' engine (strategies and search)
+            and the 'dlx' engine (search); the 'strings' engine does not take one.
+        pipeline: the StrategyPipeline the 'bitmask' engine reduces with, default_pipeline if None.
     Returns:
         The dictionary representation of the final sudoku grid. False if no solution exists.
     """
-    values = grid_values(grid)
-    # search for the solution
-    values = search(values)
-    return values
+    if board is None:
+        board = Board.for_grid(grid)
+    if recorder is not None and engine != 'strings':
+        raise ValueError("assignments are only recorded by engine='strings'")
+    if stats is not None and engine == 'strings':
+        raise ValueError("engine='strings' does not collect SolverStats")
+    if engine == 'strings':
+        if board is not diagonal_board:
+            raise ValueError("engine='strings' only solves 9x9 diagonal sudokus")
+        token = _recorder.set(recorder)
+        try:
+            values = grid_values(grid)
+            # search for the solution
+            values = search(values)
+        finally:
+            _recorder.reset(token)
+        # search() ends with None when no branch succeeds
+        return values or False
+    if engine == 'bitmask':
+        masks = search_masks(board, board.grid_masks(grid), dead_ends=dead_ends, stats=stats,
+                             pipeline=pipeline)
+        if masks is False:
+            return False
+        return board.mask_values(masks)
+    if engine == 'dlx':
+        return solve_exact_cover(grid, board, stats)
+    raise ValueError('unknown engine: %r' % (engine,))
 
+# minimal diagonal sudokus (no clue can be removed without losing uniqueness) that took the
+# bitmask engine the longest out of a few hundred generated ones
+hard_grids = [
+    '..4....8....1.7....7.........3..5.9.......8.......6..5.5.7....9.2..........6.4.2.',
+    '.......1.7......2.8....16.5.7....9..3.49.........5.........93......8...1...2..5..',
+    '...3...................5.7.2.8.6.49......8...9...5...6......6..8.7.......4..1.9..',
+    '....71.9....2...6................8..4..7.......3....71.68.9....1............3..58',
+    '........26.....9.153.....8...29....6....4.8.........9..5...........3.1....7......',
+    '.......377..8.34.....4...5..6...5....1.6.7...5.4.9.....2...............3...9.8...',
+    '.............41.6..8..2.....7......6.......5.....5.9...2..834..6.3...2.......2...',
+    '..1.9.........34....6.5.....2....5..3...7......4.......6.........781...28..5.....',
+    '.7.........279.1..5....2....4.........5...4.2....6.8.....916......4....3...2.....',
+    '......9.5.........4..37.....4.....1...5....8..619...4......9.76....1.........3...',
+    '..19.5.7..56.............15.35...1..7.....3......8....19..............6...27.....',
+    '...345.....92....4.8.6.....9.......2..6....7.....6..5...7............39....1.4...',
+    '...8..3......69..79.7.........2.14............1.6....8...93......4...........42..',
+    '.......8.5.9.......8......3.1..2...9.......7..5..7..32...3..7.4....8...5...9.4...',
+    '.5.8.1.....2..5......4......6..1...........4.7...8...5...7..1.2.1.....89.2.......',
+    '.........2.9...1.7.......2.3..7..........8..6..5....3...6..9.......4.....5..8...1',
+    '...518.9......9.........2........4..6.7.....9.2.......5.9............1..41...2...',
+    '...5..9.1....9...........63.......8.....75.2..73......8..4...9............1..62..',
+    '.....73....8.9....2......4.8..5....7...7...5....6......238...1.7.....6....1.....3',
+    '..5.......496....1......53...2.......8.....4..3.7....5.6....3.......7......4...1.',
+]
 
-if __name__ == '__main__':
-    #diag_sudoku_grid = '2.............62....1....7...6..8...3...9...7...6..4...4....8....52.............3'
-    #diag_sudoku_grid = '9.1....8.8.5.7..4.2.4....6...7......5..............83.3..6......9................'
-    #diag_sudoku_grid = '5.2...8.4...1.....4..9....5......29...........23......8....3..7.....4...1.7...3.9'
-    #diag_sudoku_grid = '2..3..4.8........7..147.6.......1...8.......4...2.......7.683..6........3.8..9..5'
-    diag_sudoku_grid = '...7.9....85...31.2......7...........1..7.6......8...7.7.........3......85.......'
-    display(solve(diag_sudoku_grid))
+def compare_engines(grids=None, engines=('bitmask', 'dlx'), repeat=3):
+    """
+    Time solve() engines on the same grids.
+    Args:
+        grids: grid strings, hard_grids by default.
+        engines: the solve() engines to compare.
+        repeat(int): solve the grids this many times per engine and keep the fastest pass.
+    Returns:
+        A dict of engine -> {'puzzles', 'solved', 'seconds', 'puzzles_per_second'}.
+    """
+    grids = hard_grids if grids is None else list(grids)
+    results = {}
+    for engine in engines:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            solved = sum(1 for grid in grids if solve(grid, engine))
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        results[engine] = {'puzzles': len(grids), 'solved': solved, 'seconds': best,
+                           'puzzles_per_second': len(grids) / best if best else float('inf')}
+    return results
+
+
+def values_grid(values):
+    """
+    Convert a sudoku in dictionary form back into grid string form.
+    Input: A sudoku in dictionary form, of any board size.
+    Output: A string of one character per box, '.' for boxes that are not solved.
+    """
+    board = Board(int(round(len(values) ** 0.5)))
+    return ''.join(values[s] if len(values[s]) == 1 else '.' for s in board.boxes)
+
+
+# solve() engine and count_solutions() limit of the worker processes of solve_many, set once by _init_worker
+_worker_engine = 'bitmask'
+_worker_count_limit = None
+
+def _init_worker(engine, count_limit):
+    """
+    Pool initializer, runs once in every worker process. The unit, peer and mask tables are
+    module globals built when the worker imports this module, so tasks only carry grid strings.
+    """
+    global _worker_engine, _worker_count_limit
+    _worker_engine = engine
+    _worker_count_limit = count_limit
+
+def _solve_task(task):
+    index, grid = task
+    try:
+        if _worker_count_limit:
+            return index, count_solutions(grid, _worker_count_limit)
+        return index, solve(grid, _worker_engine)
+    except ValueError:
+        # a malformed grid is reported on its own line instead of ending the whole run
+        return index, None
+
+def solve_many(grids, workers=None, chunksize=64, ordered=True, engine='bitmask', count_limit=None):
+    """
+    Solve many sudoku grids, spreading them over a pool of worker processes. Grids are read
+    from the iterable only as workers free up, so memory stays flat however many there are.
+    Args:
+        grids: an iterable of grid strings.
+        workers(int): number of worker processes, None for one per CPU. With 1 every grid is
+            solved in this process without starting a pool.
+        chunksize(int): number of grids handed to a worker at a time.
+        ordered(bool): yield results in input order; if False yield them as they complete.
+        engine(string): the solve() engine the workers use.
+        count_limit(int): if given, count the solutions of every grid up to this limit with
+            count_solutions() instead of solving it.
+    Returns:
+        A generator of (index, result) tuples, index being the position of the grid in grids
+        and result what solve() (or count_solutions()) returns for it, None if the grid is
+        malformed (e.g. not a supported number of boxes).
+    """
+    tasks = enumerate(grids)
+    if workers == 1:
+        _init_worker(engine, count_limit)
+        for task in tasks:
+            yield _solve_task(task)
+        return
+    with multiprocessing.Pool(workers, _init_worker, (engine, count_limit)) as pool:
+        # the pool pulls tasks from its own thread as fast as it can; a semaphore holds it to a
+        # few chunks per worker ahead of the results consumed so far
+        in_flight = threading.Semaphore(2 * chunksize * (workers or os.cpu_count() or 1))
+        closing = []
+
+        def throttled(tasks):
+            for task in tasks:
+                in_flight.acquire()
+                if closing:
+                    return
+                yield task
+
+        imap = pool.imap if ordered else pool.imap_unordered
+        try:
+            for result in imap(_solve_task, throttled(tasks), chunksize):
+                in_flight.release()
+                yield result
+        finally:
+            # unblock the feeding thread if the caller stops early
+            closing.append(True)
+            in_flight.release()
+
+
+def read_grids(lines):
+    """
+    Yield the grids of an iterable of lines, one grid per line. Blank lines and lines
+    starting with '#' are skipped.
+    """
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def open_text(path, mode='r'):
+    """
+    Open a grid file for reading ('r') or writing ('w'); '-' is stdin/stdout and a path
+    ending in .gz is read or written through gzip.
+    """
+    if path == '-':
+        return sys.stdin if mode == 'r' else sys.stdout
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't')
+    return open(path, mode)
+
+
+def visualize(grid):
+    """
+    Solve a grid with the strings engine, display it and replay its assignments with pygame.
+    """
+    # the strings engine records the assignments the visualization replays
+    recorder = AssignmentRecorder()
+    display(solve(grid, engine='strings', recorder=recorder))
 
     try:
         from visualize import visualize_assignments
-        visualize_assignments(assignments)
+        visualize_assignments(recorder.assignments)
 
     except SystemExit:
         pass
     except:
         print('We could not visualize your board due to a pygame issue. Not a problem! It is not a requirement.')
+
+
+def main(argv=None):
+    """
+    Command line entry point: stream the grids of a file or stdin, one per line, and write one
+    solution (or solution count) per line as they are found.
+    """
+    parser = argparse.ArgumentParser(description='Solve diagonal sudoku grids, one grid per line.')
+    parser.add_argument('input', nargs='?',
+                        help="file with one grid per line, .gz files are decompressed (default: '-' for stdin)")
+    parser.add_argument('-o', '--output', default='-',
+                        help="file to write to, compressed if it ends in .gz (default: '-' for stdout)")
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='number of worker processes (default: one per CPU)')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='grids handed to a worker at a time (default: 64)')
+    parser.add_argument('--unordered', action='store_true',
+                        help='write results as they complete, prefixed by the index of the input grid')
+    parser.add_argument('--engine', choices=('bitmask', 'dlx', 'strings'), default='bitmask')
+    parser.add_argument('--count-solutions', type=int, metavar='LIMIT',
+                        help='write the number of solutions of every grid instead, stopping the search '
+                             'at LIMIT; --count-solutions=2 checks that every grid has a unique solution')
+    parser.add_argument('--vectorized', type=int, metavar='BATCH_SIZE',
+                        help='propagate batches of grids with NumPy (batch.py) in this process, '
+                             'searching only the grids that stall with the bitmask engine')
+    parser.add_argument('--compare-engines', action='store_true',
+                        help='time the bitmask and dlx engines on the input grids (default: hard_grids) instead')
+    parser.add_argument('--visualize', metavar='GRID',
+                        help='solve GRID, display it and replay the assignments with pygame')
+    args = parser.parse_args(argv)
+
+    if args.visualize:
+        visualize(args.visualize)
+        return 0
+    if args.compare_engines:
+        grids = None
+        if args.input is not None:
+            with open_text(args.input) as infile:
+                grids = list(read_grids(infile))
+        for engine, result in compare_engines(grids).items():
+            print('%-8s %d/%d solved in %.3fs (%.1f puzzles/s)' % (
+                engine, result['solved'], result['puzzles'], result['seconds'], result['puzzles_per_second']))
+        return 0
+    if args.count_solutions is not None and args.count_solutions < 1:
+        parser.error('--count-solutions needs a limit of at least 1')
+    if args.count_solutions is not None and args.engine != 'bitmask':
+        parser.error('--count-solutions always counts with the bitmask engine, --engine does not apply')
+    if args.vectorized:
+        # one process, the bitmask engine, solutions only
+        for given, option in ((args.engine != 'bitmask', '--engine'), (args.workers is not None, '--workers'),
+                              (args.chunksize is not None, '--chunksize'),
+                              (args.count_solutions is not None, '--count-solutions')):
+            if given:
+                parser.error('%s does not apply to --vectorized' % option)
+
+    infile = open_text(args.input or '-')
+    outfile = open_text(args.output, 'w')
+    try:
+        if args.vectorized:
+            from batch import solve_batch
+            results = solve_batch(read_grids(infile), batch_size=args.vectorized)
+        else:
+            results = solve_many(read_grids(infile), args.workers, args.chunksize or 64,
+                                 ordered=not args.unordered, engine=args.engine,
+                                 count_limit=args.count_solutions)
+        for index, result in results:
+            if args.count_solutions:
+                line = str(result)
+            else:
+                line = values_grid(result) if result else 'unsolvable'
+            if result is None:
+                line = 'invalid'
+            if args.unordered:
+                line = '%d\t%s' % (index, line)
+            outfile.write(line + '\n')
+        outfile.flush()
+    except BrokenPipeError:
+        # the reader went away (e.g. piped into head): stop quietly, and keep the interpreter
+        # from failing again when it flushes stdout at exit
+        if outfile is sys.stdout:
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())